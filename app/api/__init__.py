@@ -2,6 +2,7 @@ from .authors import router as authors_router
 from .books import router as books_router
 from .complex_search import router as search_router
 from .genres import router as genres_router
+from .metrics import router as metrics_router
 from .reviews import router as reviews_router
 from .storage import router as storage_router
 from .users import router as users_router
@@ -12,6 +13,7 @@ all_routers = [
     books_router,
     search_router,
     genres_router,
+    metrics_router,
     reviews_router,
     storage_router,
     users_router
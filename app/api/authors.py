@@ -1,8 +1,8 @@
 from typing import List, Optional
-from fastapi import APIRouter, Query, Depends
+from fastapi import APIRouter, Query, Depends, Request, Response
 
 from app.schemas import Author, AuthorCreate, PrivilegesEnum, User
-from app.utils import UnitOfWork, get_uow
+from app.utils import UnitOfWork, get_uow, conditional_response
 from app.utils.auth import user_has_permissions
 from app.services import AuthorService
 
@@ -15,15 +15,17 @@ router = APIRouter(
 
 @router.get('/', response_model=List[Author], summary='Returns authors')
 async def get_authors(
+        request: Request, response: Response,
         name: Optional[str] = Query(None, description="Find by author name"),
+        ranked: bool = Query(False, description="Order found authors by similarity to the name"),
         uow: UnitOfWork = Depends(get_uow)
 ):
-    return await AuthorService.get_authors(name, uow)
+    return conditional_response(request, response, await AuthorService.get_authors(name, ranked, uow))
 
 
 @router.get('/{author_id}', response_model=Author, summary='Returns author')
-async def get_author(author_id: int, uow: UnitOfWork = Depends(get_uow)):
-    return await AuthorService.get_author(author_id, uow)
+async def get_author(author_id: int, request: Request, response: Response, uow: UnitOfWork = Depends(get_uow)):
+    return conditional_response(request, response, await AuthorService.get_author(author_id, uow))
 
 
 @router.post('/create', response_model=int, summary='Creates authors')
@@ -1,10 +1,15 @@
 from typing import Optional, List
-from fastapi import APIRouter, Query, BackgroundTasks, Depends
+from fastapi import APIRouter, Query, BackgroundTasks, Depends, Request, Response
 
-from app.schemas import Book, BookCreate, User, BookUpdate, PrivilegesEnum
-from app.services import BookService
-from app.utils import get_uow, UnitOfWork
+from app.schemas import (
+    Book, BookCreate, User, BookUpdate, PrivilegesEnum, BooksFiltersScheme, BooksSortEnum, BooksFacets, Page,
+    SortOrderEnum, CountModeEnum, BooksImport, BooksImportReport
+)
+from app.services import BookService, ImportService
+from app.utils import get_uow, UnitOfWork, conditional_response
+from app.settings import limits_cred
 from app.utils.auth import user_has_permissions
+from app.utils.limits import rate_limit, concurrency_limit
 
 
 router = APIRouter(
@@ -13,8 +18,8 @@ router = APIRouter(
 )
 
 
-@router.get('/', response_model=List[int], summary='Returns books using search parameters (all of them otherwise)')
-async def get_books(
+def get_books_filters(
+        theme_id: Optional[int] = Query(None, description="Filter by theme"),
         title: Optional[str] = Query(None, description="Filter by book title"),
         author: Optional[str] = Query(None, description="Filter by author"),
         genre: Optional[str] = Query(None, description="Filter by name"),
@@ -31,21 +36,58 @@ async def get_books(
             description="Maximum mark (from 1 to 5 inclusive)",
             ge=1.0,
             le=5.0
-        ),
+        )
+) -> BooksFiltersScheme:
+    return BooksFiltersScheme(
+        theme_id=theme_id, title=title, author=author, genre=genre, published_date=published_date,
+        description=description, min_mark=min_mark, max_mark=max_mark
+    )
+
+
+@router.get('/', response_model=Page[int],
+            summary='Returns a page of books ids using search parameters (all of them otherwise)')
+async def get_books(
+        filters: BooksFiltersScheme = Depends(get_books_filters),
+        sort_by: BooksSortEnum = Query(BooksSortEnum.ID, description="Sort field"),
+        order: SortOrderEnum = Query(SortOrderEnum.ASC, description="Sort order"),
+        limit: int = Query(50, description="Page size", gt=0, le=500),
+        cursor: Optional[str] = Query(None, description="Next cursor of the previous page"),
+        count: Optional[CountModeEnum] = Query(None, description="Also return total books count"),
         uow: UnitOfWork = Depends(get_uow)
 ):
-    return await BookService.get_books(
-        title, author, genre, published_date, description, min_mark, max_mark, uow
-    )
+    return await BookService.get_books(filters, sort_by, order, limit, cursor, count, uow)
+
+
+@router.get('/facets', response_model=BooksFacets,
+            summary='Returns books counts per author, genre, publication year and mark for the same filters')
+async def get_books_facets(
+        filters: BooksFiltersScheme = Depends(get_books_filters),
+        fresh: bool = Query(False, description="Bypass counts cached for a few seconds"),
+        uow: UnitOfWork = Depends(get_uow)
+):
+    return await BookService.get_facets(filters, fresh, uow)
+
+
+@router.get('/batch', response_model=List[Book],
+            summary='Returns data of several books in order of requested ids, missing ones are skipped')
+async def get_books_batch(
+        ids: List[int] = Query(..., description="Books ids", min_length=1, max_length=100),
+        uow: UnitOfWork = Depends(get_uow)
+):
+    return await BookService.get_books_batch(ids, uow)
 
 
 @router.get('/{book_id}', response_model=Book, summary='Returns book data')
-async def get_book(book_id: int, uow: UnitOfWork = Depends(get_uow)):
-    return await BookService.get_book(book_id, uow)
+async def get_book(book_id: int, request: Request, response: Response, uow: UnitOfWork = Depends(get_uow)):
+    return conditional_response(request, response, await BookService.get_book(book_id, uow))
 
 
 @router.post('/create', response_model=Book,
-             summary='Creates new book. Only for authorized user with moderator privilege')
+             summary='Creates new book. Only for authorized user with moderator privilege',
+             dependencies=[
+                 rate_limit("book_create", limits_cred.book_create_rate, limits_cred.book_create_burst),
+                 concurrency_limit("book_create", limits_cred.book_create_in_flight)
+             ])
 async def create_book(
         book: BookCreate, background_tasks: BackgroundTasks,
         user_data: User = user_has_permissions(PrivilegesEnum.MODERATOR),
@@ -72,3 +114,13 @@ async def delete_book(
         uow: UnitOfWork = Depends(get_uow)
 ):
     return await BookService.delete_book(book_id, uow)
+
+
+@router.post('/import', response_model=BooksImportReport,
+             summary='Imports books from a manifest and files located on the server. Only for admins')
+async def import_books(
+        books_import: BooksImport,
+        user_data: User = user_has_permissions(PrivilegesEnum.ADMIN),
+        uow: UnitOfWork = Depends(get_uow)
+):
+    return await ImportService.import_books(books_import, uow)
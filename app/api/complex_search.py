@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 
 from app.services import SearchService
+from app.settings import limits_cred
+from app.utils.limits import rate_limit, concurrency_limit
 
 
 router = APIRouter(
@@ -14,6 +16,10 @@ async def context_search(query: str) -> list[int]:
     return await SearchService.context_search(query)
 
 
-@router.get("/semantic", response_model=list[int])
+@router.get("/semantic", response_model=list[int],
+            dependencies=[
+                rate_limit("semantic_search", limits_cred.semantic_search_rate, limits_cred.semantic_search_burst),
+                concurrency_limit("semantic_search", limits_cred.semantic_search_in_flight)
+            ])
 async def semantic_search(query: str) -> list[int]:
     return await SearchService.semantic_search(query)
@@ -1,9 +1,9 @@
 from typing import List, Optional
-from fastapi import APIRouter, Query, Depends
+from fastapi import APIRouter, Query, Depends, Request, Response
 
 from app.schemas import Genre, GenreCreate, PrivilegesEnum, User
 from app.services import GenreService
-from app.utils import UnitOfWork, get_uow
+from app.utils import UnitOfWork, get_uow, conditional_response
 from app.utils.auth import user_has_permissions
 
 
@@ -15,15 +15,17 @@ router = APIRouter(
 
 @router.get('/', response_model=List[Genre], summary='Returns genres')
 async def get_genres(
+        request: Request, response: Response,
         name: Optional[str] = Query(None, description="Find by genre name"),
+        ranked: bool = Query(False, description="Order found genres by similarity to the name"),
         uow: UnitOfWork = Depends(get_uow)
 ):
-    return await GenreService.get_genres(name, uow)
+    return conditional_response(request, response, await GenreService.get_genres(name, ranked, uow))
 
 
 @router.get('/{genre_id}', response_model=Genre, summary='Returns genre')
-async def get_genre(genre_id: int, uow: UnitOfWork = Depends(get_uow)):
-    return await GenreService.get_genre(genre_id, uow)
+async def get_genre(genre_id: int, request: Request, response: Response, uow: UnitOfWork = Depends(get_uow)):
+    return conditional_response(request, response, await GenreService.get_genre(genre_id, uow))
 
 
 @router.post('/create', response_model=int, summary='Creates genres')
@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+
+from app.schemas import CacheStats, LimiterStats, User, PrivilegesEnum
+from app.services import MetricsService
+from app.utils.auth import user_has_permissions
+
+
+router = APIRouter(
+    prefix='/metrics',
+    tags=['metrics']
+)
+
+
+@router.get('/cache', response_model=dict[str, CacheStats],
+            summary="Returns hits and misses of this worker's caches. Admins only")
+async def get_cache_stats(user_creds: User = user_has_permissions(PrivilegesEnum.ADMIN)):
+    return MetricsService.get_cache_stats()
+
+
+@router.get('/limits', response_model=dict[str, LimiterStats],
+            summary="Returns allowed and rejected requests of this worker's rate and concurrency limiters. Admins only")
+async def get_limits_stats(user_creds: User = user_has_permissions(PrivilegesEnum.ADMIN)):
+    return MetricsService.get_limits_stats()
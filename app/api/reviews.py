@@ -1,10 +1,13 @@
-from typing import List, Annotated
-from fastapi import APIRouter, Query, Depends
+from typing import List, Annotated, Optional
+from fastapi import APIRouter, Query, Depends, Request, Response
 
-from app.schemas import User, ReviewsFiltersScheme, Review, ReviewCreate, ReviewUpdate
+from app.schemas import (
+    User, ReviewsFiltersScheme, Review, ReviewCreate, ReviewUpdate, BookRating, ReviewDetailed, ReviewsSortEnum, Page,
+    SortOrderEnum, PrivilegesEnum, RatingsReconciliation, RatingsReconciliationReport
+)
 from app.services import ReviewService
-from app.utils import UnitOfWork, get_uow
-from app.utils.auth import get_current_user
+from app.utils import UnitOfWork, get_uow, conditional_response
+from app.utils.auth import get_current_user, get_optional_user, user_has_permissions
 
 
 router = APIRouter(
@@ -21,9 +24,25 @@ async def get_reviews(
     return await ReviewService.get_reviews(filters, uow)
 
 
+@router.get('/page', response_model=Page[ReviewDetailed],
+            summary="Returns a page of reviews with owners' names maybe filtered by book and user")
+async def get_reviews_page(
+        book_id: Optional[int] = Query(None, description="Filter by book"),
+        owner_id: Optional[int] = Query(None, description="Filter by review owner"),
+        sort_by: ReviewsSortEnum = Query(ReviewsSortEnum.ID, description="Sort field"),
+        order: SortOrderEnum = Query(SortOrderEnum.ASC, description="Sort order"),
+        limit: int = Query(50, description="Page size", gt=0, le=100),
+        cursor: Optional[str] = Query(None, description="Next cursor of the previous page"),
+        uow: UnitOfWork = Depends(get_uow)
+) -> Page[ReviewDetailed]:
+    return await ReviewService.get_reviews_page(book_id, owner_id, sort_by, order, limit, cursor, uow)
+
+
 @router.get('/{review_id}', response_model=Review, summary='Returns review')
-async def get_review(review_id: int, uow: UnitOfWork = Depends(get_uow)) -> Review:
-    return await ReviewService.get_review(review_id, uow)
+async def get_review(
+        review_id: int, request: Request, response: Response, uow: UnitOfWork = Depends(get_uow)
+) -> Review:
+    return conditional_response(request, response, await ReviewService.get_review(review_id, uow))
 
 
 @router.get('/average/{book_id}', response_model=float, summary='Returns average mark for book')
@@ -36,6 +55,23 @@ async def get_marks_count(book_id: int, uow: UnitOfWork = Depends(get_uow)) -> i
     return await ReviewService.get_marks_count(book_id, uow)
 
 
+@router.get('/rating/{book_id}', response_model=BookRating,
+            summary='Returns average mark, marks count and marks histogram (1 to 5) for book')
+async def get_rating(book_id: int, uow: UnitOfWork = Depends(get_uow)) -> BookRating:
+    return await ReviewService.get_rating(book_id, uow)
+
+
+@router.get('/ratings', response_model=List[BookRating],
+            summary="Returns ratings of several books in order of requested ids, missing ones are skipped. "
+                    "For authorized users also returns their own marks")
+async def get_ratings(
+        ids: List[int] = Query(..., description="Books ids", min_length=1, max_length=100),
+        user_creds: Optional[User] = Depends(get_optional_user),
+        uow: UnitOfWork = Depends(get_uow)
+) -> List[BookRating]:
+    return await ReviewService.get_ratings(ids, user_creds, uow)
+
+
 @router.post('/create', response_model=Review,
              summary='Creates new review. Only for authorized users. One review from one user for one book')
 async def create_review(
@@ -64,3 +100,13 @@ async def delete_review(
         uow: UnitOfWork = Depends(get_uow)
 ) -> Review:
     return await ReviewService.delete_review(review_id, user_creds, uow)
+
+
+@router.post('/reconcile', response_model=RatingsReconciliationReport,
+             summary="Recomputes books' ratings from reviews and reports drifted ones. Only for admins")
+async def reconcile_ratings(
+        reconciliation: RatingsReconciliation,
+        user_creds: User = user_has_permissions(PrivilegesEnum.ADMIN),
+        uow: UnitOfWork = Depends(get_uow)
+) -> RatingsReconciliationReport:
+    return await ReviewService.reconcile_ratings(reconciliation, uow)
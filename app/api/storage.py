@@ -1,9 +1,15 @@
-from fastapi import APIRouter, File, UploadFile
+from fastapi import APIRouter, File, UploadFile, Request, Depends
 from fastapi.responses import StreamingResponse
 
-from app.schemas import FileUploadedScheme, User, PrivilegesEnum
+from app.schemas import (
+    FileUploadedScheme, User, PrivilegesEnum, PresignedUploadRequest, PresignedUpload, FileUploadCompletion,
+    FileStreamUploaded
+)
 from app.services import StorageService
+from app.settings import limits_cred
+from app.utils import UnitOfWork, get_uow
 from app.utils.auth import user_has_permissions
+from app.utils.limits import rate_limit, concurrency_limit
 
 
 router = APIRouter(
@@ -11,24 +17,56 @@ router = APIRouter(
     tags=['storage']
 )
 
+upload_rate_limit = rate_limit("upload", limits_cred.upload_rate, limits_cred.upload_burst)
+upload_concurrency_limit = concurrency_limit("upload", limits_cred.upload_in_flight)
+
 
-@router.post("/", response_model=FileUploadedScheme, summary="Uploads new file. Privileged users only.")
-def upload_file(
+@router.post("/", response_model=FileUploadedScheme, summary="Uploads new file. Privileged users only.",
+             dependencies=[upload_rate_limit, upload_concurrency_limit])
+async def upload_file(
         file: UploadFile = File(...), user_data: User = user_has_permissions(PrivilegesEnum.MODERATOR)
 ):
-    return StorageService.upload_file(file)
+    return await StorageService.upload_file(file)
+
+
+@router.put("/stream/{filename}", response_model=FileStreamUploaded,
+            summary="Uploads new file sent as the raw request body, streaming it to storage. Privileged users only.",
+            dependencies=[upload_rate_limit, upload_concurrency_limit])
+async def upload_file_stream(
+        filename: str, request: Request, user_data: User = user_has_permissions(PrivilegesEnum.MODERATOR)
+):
+    return await StorageService.upload_file_stream(filename, request)
+
+
+@router.post("/presigned", response_model=PresignedUpload,
+             summary="Returns a short-lived URL to PUT a new file to directly. Privileged users only.",
+             dependencies=[upload_rate_limit])
+async def create_presigned_upload(
+        upload: PresignedUploadRequest, user_data: User = user_has_permissions(PrivilegesEnum.MODERATOR)
+):
+    return await StorageService.create_presigned_upload(upload)
+
+
+@router.post("/complete", response_model=FileUploadedScheme,
+             summary="Confirms a presigned upload, optionally attaching the PDF to a book. Privileged users only.")
+async def complete_upload(
+        completion: FileUploadCompletion,
+        user_data: User = user_has_permissions(PrivilegesEnum.MODERATOR),
+        uow: UnitOfWork = Depends(get_uow)
+):
+    return await StorageService.complete_upload(completion, uow)
 
 
 @router.get("/download/{filename}", response_class=StreamingResponse)
-def download_file(filename: str):
-    return StorageService.download_file(filename)
+async def download_file(filename: str, request: Request):
+    return await StorageService.download_file(filename, request)
 
 
 @router.get("/list", response_model=list[FileUploadedScheme])
-def list_files():
-    return StorageService.list_files()
+async def list_files():
+    return await StorageService.list_files()
 
 
 @router.delete("{filename}", status_code=200, summary="Deletes file. Privileged users only.")
-def delete_file(filename: str, user_data: User = user_has_permissions(PrivilegesEnum.MODERATOR)):
-    return StorageService.delete_file(filename)
+async def delete_file(filename: str, user_data: User = user_has_permissions(PrivilegesEnum.MODERATOR)):
+    return await StorageService.delete_file(filename)
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, status, Response, Depends
+from typing import Optional
+from fastapi import APIRouter, HTTPException, status, Response, Depends, Query
 
-from app.schemas import UserRegister, UserLogin, User, UserLogined, PrivilegesEnum, UserUpdate
+from app.schemas import UserRegister, UserLogin, User, UserLogined, PrivilegesEnum, UserUpdate, Page
 from app.services import UserService
 from app.utils import UnitOfWork, get_uow
+from app.settings import limits_cred
 from app.utils.auth import get_current_user, user_has_permissions
+from app.utils.limits import rate_limit
 
 
 router = APIRouter(
@@ -11,18 +14,21 @@ router = APIRouter(
     tags=['user']
 )
 
+# password hashing makes both endpoints CPU-heavy
+auth_rate_limit = rate_limit("auth", limits_cred.auth_rate, limits_cred.auth_burst)
+
 
 @router.get('/profile', response_model=User, summary='Returns authorized user')
 async def get_profile(user_data: User = Depends(get_current_user)):
     return user_data
 
 
-@router.post('/login', response_model=User, summary='Logs user in')
+@router.post('/login', response_model=User, summary='Logs user in', dependencies=[auth_rate_limit])
 async def login(response: Response, user_data: UserLogin, uow: UnitOfWork = Depends(get_uow)):
     return await UserService.login(response, user_data, uow)
 
 
-@router.post('/register', response_model=UserLogined, summary='Creates new user')
+@router.post('/register', response_model=UserLogined, summary='Creates new user', dependencies=[auth_rate_limit])
 async def register(user_data: UserRegister, uow: UnitOfWork = Depends(get_uow)):
     return await UserService.register(user_data, uow)
 
@@ -64,8 +70,12 @@ async def get_user_by_id(user_id: int, uow: UnitOfWork = Depends(get_uow)):
     return await UserService.get_user_by_id(user_id, uow)
 
 
-@router.get('/', response_model=list[User], summary='Returns all users')
+@router.get('/', response_model=Page[User], summary='Returns a page of users maybe searched by name or email prefix')
 async def get_users(
-        user_creds: User = user_has_permissions(PrivilegesEnum.ADMIN), uow: UnitOfWork = Depends(get_uow)
+        search: Optional[str] = Query(None, description="Name or email prefix, case-insensitive"),
+        limit: int = Query(50, description="Page size", gt=0, le=500),
+        cursor: Optional[str] = Query(None, description="Next cursor of the previous page"),
+        user_creds: User = user_has_permissions(PrivilegesEnum.ADMIN),
+        uow: UnitOfWork = Depends(get_uow)
 ):
-    return await UserService.get_users(uow)
+    return await UserService.get_users(search, limit, cursor, uow)
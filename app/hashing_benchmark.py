@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.utils.crypt import pwd_context, verify_password
+
+
+async def probe_latencies(stop: asyncio.Event, interval: float) -> list[float]:
+    """Delays of a cheap request handler: how late the event loop wakes it up"""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        latencies.append(time.perf_counter() - started - interval)
+    return latencies
+
+
+async def _login_burst(logins: int, hashed: str, offloaded: bool) -> None:
+    async def login() -> None:
+        if offloaded:
+            await verify_password("password", hashed)
+        else:
+            pwd_context.verify("password", hashed)
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+
+
+async def run(logins: int, offloaded: bool) -> None:
+    hashed = pwd_context.hash("password")
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_latencies(stop, 0.001))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await _login_burst(logins, hashed, offloaded)
+    seconds = time.perf_counter() - started
+    stop.set()
+    latencies = sorted(await probe)
+
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if len(latencies) >= 100 else max(latencies, default=0.0)
+    print(f"{'executor' if offloaded else 'event loop'}: {logins / seconds:.1f} logins/s, "
+          f"other requests delay p50 {statistics.median(latencies or [0.0]) * 1000:.1f} ms, "
+          f"p99 {p99 * 1000:.1f} ms, max {max(latencies, default=0.0) * 1000:.1f} ms")
+
+
+## shell: python -m app.hashing_benchmark --logins 50
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Login throughput and latency of other requests during a login burst, "
+                    "with password checks on the event loop and in the hashing executor"
+    )
+    parser.add_argument("--logins", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, offloaded=False))
+    asyncio.run(run(args.logins, offloaded=True))
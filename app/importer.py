@@ -0,0 +1,28 @@
+import argparse
+import asyncio
+
+from app.schemas import BooksImport
+from app.services import ImportService
+from app.utils import UnitOfWork, close_connections
+
+
+## shell: python -m app.importer books.jsonl ./files --batch-size 200 --concurrency 16
+async def main(books_import: BooksImport) -> None:
+    try:
+        report = await ImportService.import_books(books_import, UnitOfWork())
+        print(report.model_dump_json(indent=2))
+    finally:
+        await close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import of books described by a JSONL or CSV manifest")
+    parser.add_argument("manifest_path")
+    parser.add_argument("files_dir")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(BooksImport(
+        manifest_path=args.manifest_path, files_dir=args.files_dir,
+        batch_size=args.batch_size, concurrency=args.concurrency
+    )))
@@ -1,18 +1,32 @@
+import asyncio
+import contextlib
 import uvicorn
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api import all_routers
-from app.settings import init_elastic_indexing
-from app.utils import create_tables, close_connections
+from app.services import ReviewService
+from app.settings import init_elastic_indexing, reviews_cred
+from app.utils import create_tables, close_connections, shutdown_hashing, UnitOfWork
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_elastic_indexing()
     await create_tables()
+    # marks left pending by a previous run or by switching back to immediate mode
+    await ReviewService.flush_pending_ratings(UnitOfWork())
+    rating_flusher = None
+    if reviews_cred.rating_mode == "deferred":
+        rating_flusher = asyncio.create_task(ReviewService.run_rating_flusher(UnitOfWork()))
     yield
+    if rating_flusher is not None:
+        rating_flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await rating_flusher
+        await ReviewService.flush_pending_ratings(UnitOfWork())
+    shutdown_hashing()
     await close_connections()
 
 
@@ -1,11 +1,11 @@
-from sqlalchemy import MetaData, Table, Column, Integer, String, Date, ForeignKey, Float
+from sqlalchemy import MetaData, Table, Column, Integer, String, Date, ForeignKey, Float, Index, func
 from sqlalchemy.dialects.postgresql import ENUM
 from sqlalchemy.orm import declarative_base
 
 
 db_metadata = MetaData()
 privileges_enum = ENUM("basic", "admin", "moderator", name="privileges", metadata=db_metadata)
-Base = declarative_base()
+Base = declarative_base(metadata=db_metadata)
 
 
 class User(Base):
@@ -17,6 +17,22 @@ class User(Base):
     password_hash = Column(String(512))
     privileges = Column(ENUM("basic", "admin", "moderator", name="privileges"), default="basic")
 
+    __table_args__ = (
+        Index('ix_user_table_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        Index('ix_user_table_email_trgm', 'email', postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'}),
+    )
+
+
+# emails are unique case-insensitively, text_pattern_ops let the indexes serve prefix searches as well
+Index(
+    'ux_user_table_email_lower', func.lower(User.email).label('email_lower'),
+    unique=True, postgresql_ops={'email_lower': 'text_pattern_ops'}
+)
+Index(
+    'ix_user_table_name_lower', func.lower(User.name).label('name_lower'),
+    postgresql_ops={'name_lower': 'text_pattern_ops'}
+)
+
 
 class Author(Base):
     __tablename__ = 'author_table'
@@ -24,6 +40,13 @@ class Author(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(150))
 
+    __table_args__ = (
+        Index('ix_author_table_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
+
+Index('ux_author_table_name_normalized', func.lower(func.btrim(Author.name)), unique=True)
+
 
 class Genre(Base):
     __tablename__ = 'genre_table'
@@ -31,6 +54,13 @@ class Genre(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(150))
 
+    __table_args__ = (
+        Index('ix_genre_table_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
+
+Index('ux_genre_table_name_normalized', func.lower(func.btrim(Genre.name)), unique=True)
+
 
 class Book(Base):
     __tablename__ = 'book_table'
@@ -38,21 +68,60 @@ class Book(Base):
     id = Column(Integer, primary_key=True)
     theme_id = Column(Integer, nullable=False)
     title = Column(String(50))
-    author = Column(ForeignKey('author_table.id'), nullable=False)
-    genre = Column(ForeignKey('genre_table.id'), nullable=True)
+    author = Column(ForeignKey('author_table.id'), index=True, nullable=False)
+    genre = Column(ForeignKey('genre_table.id'), index=True, nullable=True)
     published_date = Column(Integer, nullable=True)
     description = Column(String, nullable=True)
-    image_qname = Column(String, nullable=True)
-    pdf_qname = Column(String)
+    image_qname = Column(String, nullable=True, index=True)
+    pdf_qname = Column(String, index=True)
     avg_mark = Column(Float)
     marks_count = Column(Integer)
+    # marks histogram, marks_<n> is the number of reviews with mark n
+    marks_1 = Column(Integer, nullable=False, default=0, server_default='0')
+    marks_2 = Column(Integer, nullable=False, default=0, server_default='0')
+    marks_3 = Column(Integer, nullable=False, default=0, server_default='0')
+    marks_4 = Column(Integer, nullable=False, default=0, server_default='0')
+    marks_5 = Column(Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        Index('ix_book_table_theme_id_id', 'theme_id', 'id'),
+        Index('ix_book_table_title_id', 'title', 'id'),
+        Index('ix_book_table_published_date_id', 'published_date', 'id'),
+        Index('ix_book_table_avg_mark_id', 'avg_mark', 'id'),
+        Index('ix_book_table_marks_count_id', 'marks_count', 'id'),
+        Index('ix_book_table_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+        Index(
+            'ix_book_table_description_trgm', 'description',
+            postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'}
+        ),
+    )
 
 
 class Review(Base):
     __tablename__ = 'review_table'
     id = Column(Integer, primary_key=True)
-    owner_id = Column(ForeignKey('user_table.id', ondelete='CASCADE'), index=True, nullable=False)
-    book_id = Column(ForeignKey('book_table.id', ondelete='CASCADE'), index=True, nullable=False)
+    owner_id = Column(ForeignKey('user_table.id', ondelete='CASCADE'), nullable=False)
+    book_id = Column(ForeignKey('book_table.id', ondelete='CASCADE'), nullable=False)
     mark = Column(Integer)
     text = Column(String, nullable=True)
     last_edit_date = Column(Date)
+
+    __table_args__ = (
+        Index('ix_review_table_book_id_id', 'book_id', 'id'),
+        Index('ix_review_table_owner_id_id', 'owner_id', 'id'),
+        Index('ux_review_table_owner_id_book_id', 'owner_id', 'book_id', unique=True),
+    )
+
+
+class BookRatingShard(Base):
+    """Pending marks of a book not yet folded into its avg_mark and marks_count"""
+    __tablename__ = 'book_rating_shard_table'
+    book_id = Column(ForeignKey('book_table.id', ondelete='CASCADE'), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    marks_count = Column(Integer, nullable=False, default=0)
+    marks_sum = Column(Integer, nullable=False, default=0)
+    marks_1 = Column(Integer, nullable=False, default=0)
+    marks_2 = Column(Integer, nullable=False, default=0)
+    marks_3 = Column(Integer, nullable=False, default=0)
+    marks_4 = Column(Integer, nullable=False, default=0)
+    marks_5 = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,23 @@
+import argparse
+import asyncio
+
+from app.schemas import RatingsReconciliation
+from app.services import ReviewService
+from app.utils import UnitOfWork, close_connections
+
+
+## shell: python -m app.reconcile --batch-size 1000
+async def main(reconciliation: RatingsReconciliation) -> None:
+    try:
+        report = await ReviewService.reconcile_ratings(reconciliation, UnitOfWork())
+        print(report.model_dump_json(indent=2))
+    finally:
+        await close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recomputes books' ratings from reviews and reports the drift")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--book-id", type=int, action="append", dest="book_ids", help="Book to check, repeatable")
+    args = parser.parse_args()
+    asyncio.run(main(RatingsReconciliation(book_ids=args.book_ids, batch_size=args.batch_size)))
@@ -1,11 +1,14 @@
-from typing import List, Optional
-from sqlalchemy import select, insert, delete, update
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select, delete, update, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncConnection
 from sqlalchemy.exc import IntegrityError
 
 from app.models import Author
 from app.schemas import AuthorCreate
-from app.utils import CrudException
+from app.utils import (
+    CrudException, contains, similarity, normalized, normalize_name, books_cache, authors_cache, author_ids_cache
+)
 
 from .base import SQLAlchemyRepository
 
@@ -26,24 +29,30 @@ class AuthorsRepository(SQLAlchemyRepository):
     async def get_multiple(
             cls,
             connection: AsyncConnection,
-            name: Optional[str] = None
+            name: Optional[str] = None,
+            ranked: bool = False
     ) -> List[Author]:
         query = select(Author)
 
         if name is not None:
-            query = query.where(Author.name.ilike(f"%{name}%"))
+            query = query.where(contains(Author.name, name))
+            if ranked:
+                query = query.order_by(similarity(Author.name, name).desc(), Author.id)
 
         result = await connection.execute(query)
         return result.mappings().all()
 
     @classmethod
-    async def create(cls, connection: AsyncConnection, author: AuthorCreate) -> int:
+    async def create(cls, connection: AsyncConnection, author: AuthorCreate) -> Optional[int]:
+        """Returns None when an author with the same normalized name already exists"""
         result = await connection.execute(
-            insert(Author)
-            .values(name=author.name)
+            pg_insert(Author)
+            .values(name=author.name.strip())
+            .on_conflict_do_nothing(index_elements=[normalized(Author.name)])
             .returning(Author.id)
         )
-        return result.scalar_one()
+        await authors_cache.delete_prefix("list:")
+        return result.scalar_one_or_none()
 
     @classmethod
     async def get_existent_or_create(
@@ -51,17 +60,39 @@ class AuthorsRepository(SQLAlchemyRepository):
             connection: AsyncConnection,
             author: AuthorCreate
     ) -> int:
-        existing_authors = await cls.get_multiple(connection, name=author.name)
+        ids = await cls.get_existent_or_create_many(connection, [author.name])
+        return ids[normalize_name(author.name)]
 
-        if existing_authors:
-            return existing_authors[0].id
+    @classmethod
+    async def get_existent_or_create_many(
+            cls,
+            connection: AsyncConnection,
+            names: Iterable[str]
+    ) -> Dict[str, int]:
+        """Ids of authors keyed by normalized names, missing ones are upserted in one statement"""
+        names = {normalize_name(name): name.strip() for name in names}
+        ids = {}
+        for key in names:
+            author_id = await author_ids_cache.get(key)
+            if author_id is not None:
+                ids[key] = author_id
 
-        result = await connection.execute(
-            insert(Author)
-            .values(name=author.name)
-            .returning(Author.id)
-        )
-        return result.scalar_one()
+        missing = [{'name': name} for key, name in names.items() if key not in ids]
+        if missing:
+            result = await connection.execute(
+                pg_insert(Author)
+                .values(missing)
+                .on_conflict_do_update(index_elements=[normalized(Author.name)], set_={'name': Author.name})
+                .returning(Author.id, Author.name, literal_column('xmax = 0').label('inserted'))
+            )
+            for row in result.all():
+                ids[normalize_name(row.name)] = row.id
+                # ids of rows inserted by this transaction are gone if it is rolled back
+                if row.inserted:
+                    await authors_cache.delete_prefix("list:")
+                else:
+                    await author_ids_cache.set(normalize_name(row.name), row.id)
+        return ids
 
     @classmethod
     async def delete(cls, connection: AsyncConnection, author_id: int) -> Optional[Author]:
@@ -72,6 +103,9 @@ class AuthorsRepository(SQLAlchemyRepository):
                     delete(Author)
                     .where(Author.id == author_id)
                 )
+                await authors_cache.delete(str(author_id))
+                await authors_cache.delete_prefix("list:")
+                await author_ids_cache.clear()
             return author
         except IntegrityError as e:
             raise CrudException(
@@ -93,6 +127,11 @@ class AuthorsRepository(SQLAlchemyRepository):
                     .where(Author.id == author_id)
                     .values(name=author.name)
                 )
+                await authors_cache.delete(str(author_id))
+                await authors_cache.delete_prefix("list:")
+                await author_ids_cache.clear()
+                # cached books carry the author name
+                await books_cache.clear()
             return author_in_db
         except IntegrityError as e:
             raise CrudException(
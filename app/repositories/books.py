@@ -1,10 +1,17 @@
 import urllib.parse
 from typing import List, Optional
-from sqlalchemy import select, and_, update, insert, delete
+from sqlalchemy import select, exists, update, insert, delete, func, cast, or_, Integer, FromClause, Select
 from sqlalchemy.ext.asyncio import AsyncConnection
 
 from app import models
-from app.schemas import Book, BookCreate, BookUpdate, BookIndex, GenreCreate, AuthorCreate
+from app.schemas import (
+    Book, BookCreate, BookUpdate, BookIndex, BooksFiltersScheme, BooksSortEnum, BooksFacets, FacetCount,
+    GenreCreate, AuthorCreate, Page, SortOrderEnum, CountModeEnum
+)
+from app.utils import (
+    encode_cursor, decode_cursor, keyset_condition, keyset_order, count_rows, contains, similarity, normalize_name,
+    books_cache
+)
 
 from .authors import AuthorsRepository
 from .base import SQLAlchemyRepository
@@ -17,65 +24,148 @@ __all__ = ["BooksRepository"]
 
 
 class BooksRepository(SQLAlchemyRepository):
+    @staticmethod
+    def _select_books(source: FromClause = models.Book.__table__) -> Select:
+        """Select book rows from `source` with author and genre ids replaced by their names"""
+        return (
+            select(
+                *[column for column in source.c if column.name not in ('author', 'genre')],
+                models.Author.name.label('author'),
+                models.Genre.name.label('genre')
+            )
+            .select_from(source)
+            .join(models.Author, models.Author.id == source.c.author)
+            .outerjoin(models.Genre, models.Genre.id == source.c.genre)
+        )
+
     @classmethod
     async def get(cls, connection: AsyncConnection, element_id: int) -> Optional[Book]:
         result = await connection.execute(
-            select(models.Book)
-            .where(models.Book.id == element_id)
+            cls._select_books().where(models.Book.id == element_id)
         )
-        book_model = result.mappings().first()
-        author = await AuthorsRepository.get(connection, book_model.author)
-        author_name = author and author.name
-        genre = await GenresRepository.get(connection, book_model.genre)
-        genre_name = genre and genre.name
-        return Book(
-            id=book_model.id, theme_id=book_model.theme_id, title=book_model.title,
-            author=author_name, genre=genre_name, published_date=book_model.published_date,
-            description=book_model.description, image_qname=book_model.image_qname,
-            pdf_qname=book_model.pdf_qname, avg_mark=book_model.avg_mark,
-            marks_count=book_model.marks_count
+        book = result.mappings().first()
+        return Book(**book) if book else None
+
+    @classmethod
+    async def get_many(cls, connection: AsyncConnection, element_ids: List[int]) -> List[Book]:
+        if not element_ids:
+            return []
+        result = await connection.execute(
+            cls._select_books().where(models.Book.id.in_(set(element_ids)))
         )
+        books = {row.id: Book(**row) for row in result.mappings().all()}
+        return [books[book_id] for book_id in element_ids if book_id in books]
+
+    @staticmethod
+    def _filters(filters: BooksFiltersScheme) -> list:
+        """WHERE clauses for `filters`; author and genre match any of the similarly named ones"""
+        clauses = []
+        if filters.theme_id is not None:
+            clauses.append(models.Book.theme_id == filters.theme_id)
+        if filters.title:
+            clauses.append(contains(models.Book.title, filters.title))
+        if filters.author:
+            clauses.append(
+                exists()
+                .where(models.Author.id == models.Book.author, contains(models.Author.name, filters.author))
+                .correlate(models.Book)
+            )
+        if filters.genre:
+            clauses.append(
+                exists()
+                .where(models.Genre.id == models.Book.genre, contains(models.Genre.name, filters.genre))
+                .correlate(models.Book)
+            )
+        if filters.published_date:
+            clauses.append(models.Book.published_date == filters.published_date)
+        if filters.description:
+            clauses.append(contains(models.Book.description, filters.description))
+        if filters.min_mark is not None:
+            clauses.append(models.Book.avg_mark >= filters.min_mark)
+        if filters.max_mark is not None:
+            clauses.append(models.Book.avg_mark <= filters.max_mark)
+        return clauses
 
     @classmethod
     async def get_multiple(
             cls,
             connection: AsyncConnection,
-            title: Optional[str] = None,
-            author: Optional[str] = None,
-            genre: Optional[str] = None,
-            published_date: Optional[int] = None,
-            description: Optional[str] = None,
-            min_mark: Optional[float] = None,
-            max_mark: Optional[float] = None
-    ) -> List[int]:
-        query = select(models.Book.id)
-        filters = []
-        if title:
-            filters.append(models.Book.title.ilike(f"%{title}%"))
-        if author:
-            author_in_db = await AuthorsRepository.get_multiple(connection, author)
-            if not author_in_db:
-                return []
-            filters.append(models.Book.author == author_in_db[0].id)
-        if genre:
-            genre_in_db = await GenresRepository.get_multiple(connection, genre)
-            if not genre_in_db:
-                return []
-            filters.append(models.Book.genre == genre_in_db[0].id)
-        if published_date:
-            filters.append(models.Book.published_date == published_date)
-        if description:
-            filters.append(models.Book.description.ilike(f"%{description}%"))
-        if min_mark is not None:
-            filters.append(models.Book.avg_mark >= min_mark)
-        if max_mark is not None:
-            filters.append(models.Book.avg_mark <= max_mark)
-
-        if filters:
-            query = query.where(and_(*filters))
-
-        result = await connection.execute(query)
-        return [book_id for (book_id,) in result.all()]
+            filters: BooksFiltersScheme = None,
+            sort_by: BooksSortEnum = BooksSortEnum.ID,
+            order: SortOrderEnum = SortOrderEnum.ASC,
+            limit: int = 50,
+            cursor: Optional[str] = None,
+            count: Optional[CountModeEnum] = None
+    ) -> Page[int]:
+        if filters is None:
+            filters = BooksFiltersScheme()
+
+        clauses = cls._filters(filters)
+        if sort_by == BooksSortEnum.RELEVANCE:
+            if not filters.title:
+                raise ValueError("Sorting by relevance requires a title filter")
+            sort_column = similarity(models.Book.title, filters.title)
+        else:
+            sort_column = getattr(models.Book, sort_by.value)
+        descending = order == SortOrderEnum.DESC
+        query = select(models.Book.id).where(*clauses)
+
+        total = None
+        if count is not None:
+            total = await count_rows(connection, query, estimated=count == CountModeEnum.ESTIMATED)
+
+        if cursor is not None:
+            cursor_sort, value, last_id = decode_cursor(cursor, 3)
+            if cursor_sort != sort_by.value:
+                raise ValueError("Cursor belongs to another sort field")
+            query = query.where(keyset_condition(sort_column, value, models.Book.id, last_id, descending))
+
+        result = await connection.execute(
+            query.add_columns(sort_column.label('sort_value'))
+            .order_by(*keyset_order(sort_column, models.Book.id, descending))
+            .limit(limit + 1)
+        )
+        rows = result.all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([sort_by.value, rows[-1].sort_value, rows[-1].id])
+        return Page[int](items=[row.id for row in rows], next_cursor=next_cursor, total=total)
+
+    @classmethod
+    async def get_facets(cls, connection: AsyncConnection, filters: BooksFiltersScheme = None) -> BooksFacets:
+        """Books counts per author, genre, publication year and whole part of avg_mark in one grouped pass"""
+        if filters is None:
+            filters = BooksFiltersScheme()
+
+        mark = cast(func.floor(models.Book.avg_mark), Integer)
+        facets = {
+            'authors': models.Author.name,
+            'genres': models.Genre.name,
+            'published_dates': models.Book.published_date,
+            'marks': mark,
+        }
+        result = await connection.execute(
+            select(
+                *[column.label(name) for name, column in facets.items()],
+                *[func.grouping(column).label(f'{name}_grouping') for name, column in facets.items()],
+                func.count().label('count')
+            )
+            .select_from(models.Book)
+            .join(models.Author, models.Author.id == models.Book.author)
+            .outerjoin(models.Genre, models.Genre.id == models.Book.genre)
+            .where(*cls._filters(filters))
+            .group_by(func.grouping_sets(*facets.values()))
+            .order_by(func.count().desc())
+        )
+
+        books_facets = BooksFacets()
+        for row in result.mappings().all():
+            for name in facets:
+                if row[f'{name}_grouping'] == 0:
+                    getattr(books_facets, name).append(FacetCount(value=row[name], count=row['count']))
+        return books_facets
 
     @classmethod
     async def create(cls, connection: AsyncConnection, model: BookCreate) -> Optional[Book]:
@@ -94,26 +184,79 @@ class BooksRepository(SQLAlchemyRepository):
         )
         book_data['author'] = author_id
 
-        result = await connection.execute(insert(models.Book).values(**book_data).returning(models.Book.id))
-        return await cls.get(connection, result.scalar())
+        inserted = (
+            insert(models.Book)
+            .values(**book_data)
+            .returning(*models.Book.__table__.c)
+            .cte('inserted_book')
+        )
+        result = await connection.execute(cls._select_books(inserted))
+        return Book(**result.mappings().one())
+
 
+    @classmethod
+    async def create_many(cls, connection: AsyncConnection, models_list: List[BookCreate]) -> List[int]:
+        """Inserts books with multi-row INSERTs, returns their ids in the same order"""
+        if not models_list:
+            return []
+        author_ids = await AuthorsRepository.get_existent_or_create_many(
+            connection, [model.author for model in models_list]
+        )
+        genre_ids = await GenresRepository.get_existent_or_create_many(
+            connection, [model.genre for model in models_list if model.genre]
+        )
+
+        books_data = []
+        for model in models_list:
+            book_data = model.model_dump()
+            book_data['author'] = author_ids[normalize_name(model.author)]
+            book_data['genre'] = genre_ids[normalize_name(model.genre)] if model.genre else None
+            books_data.append(book_data)
+
+        result = await connection.execute(
+            insert(models.Book).returning(models.Book.id, sort_by_parameter_order=True),
+            books_data
+        )
+        return list(result.scalars().all())
 
     @classmethod
     async def delete(cls, connection: AsyncConnection, element_id: int) -> Optional[Book]:
-        book = await cls.get(connection, element_id)
+        deleted = (
+            delete(models.Book)
+            .where(models.Book.id == element_id)
+            .returning(*models.Book.__table__.c)
+            .cte('deleted_book')
+        )
+        result = await connection.execute(cls._select_books(deleted))
+        book = result.mappings().first()
         if not book:
             return None
+        book = Book(**book)
+        await books_cache.delete(str(element_id))
 
         if book.pdf_qname:
             await Indexing.delete_book(element_id)
-            Storage.delete_file_in_s3(urllib.parse.unquote(book.pdf_qname))
+            await cls._delete_unreferenced_file(connection, book.pdf_qname, element_id)
 
         if book.image_qname:
-            Storage.delete_file_in_s3(urllib.parse.unquote(book.image_qname))
+            await cls._delete_unreferenced_file(connection, book.image_qname, element_id)
 
-        await connection.execute(delete(models.Book).where(models.Book.id == element_id))
         return book
 
+    @classmethod
+    async def _delete_unreferenced_file(cls, connection: AsyncConnection, qname: str, book_id: int) -> None:
+        """Files are content-addressed, so books with identical files share one: it goes with the last of them"""
+        result = await connection.execute(
+            select(
+                exists().where(
+                    or_(models.Book.pdf_qname == qname, models.Book.image_qname == qname),
+                    models.Book.id != book_id
+                )
+            )
+        )
+        if not result.scalar():
+            await Storage.delete_file_in_s3(urllib.parse.unquote(qname))
+
     @classmethod
     async def update(
             cls,
@@ -129,14 +272,16 @@ class BooksRepository(SQLAlchemyRepository):
         if 'pdf_qname' in update_data and update_data['pdf_qname'] != book.pdf_qname:
             if book.pdf_qname:
                 await Indexing.delete_book(element_id)
-                Storage.delete_file_in_s3(urllib.parse.unquote(book.pdf_qname))
+                await cls._delete_unreferenced_file(connection, book.pdf_qname, element_id)
 
             if update_data['pdf_qname']:
-                await Indexing.index_book(element_id, BookIndex(**update_data))
+                await Indexing.index_book(element_id, BookIndex(
+                    genre=update_data.get('genre', book.genre), pdf_qname=update_data['pdf_qname']
+                ))
 
         if 'image_qname' in update_data and update_data['image_qname'] != book.image_qname:
             if book.image_qname:
-                Storage.delete_file_in_s3(urllib.parse.unquote(book.image_qname))
+                await cls._delete_unreferenced_file(connection, book.image_qname, element_id)
 
         if 'genre' in update_data and update_data['genre']:
             genre_id = await GenresRepository.get_existent_or_create(
@@ -152,11 +297,16 @@ class BooksRepository(SQLAlchemyRepository):
             )
             update_data['author'] = author_id
 
-        for key, value in update_data.items():
-            if update_data[key] is None:
-                update_data[key] = update_data[key]
-
-        query = update(models.Book).where(models.Book.id == element_id).values(**update_data)
-        await connection.execute(query)
+        if not update_data:
+            return book
 
-        return await cls.get(connection, element_id)
+        updated = (
+            update(models.Book)
+            .where(models.Book.id == element_id)
+            .values(**update_data)
+            .returning(*models.Book.__table__.c)
+            .cte('updated_book')
+        )
+        result = await connection.execute(cls._select_books(updated))
+        await books_cache.delete(str(element_id))
+        return Book(**result.mappings().one())
@@ -1,11 +1,14 @@
-from typing import List, Optional
-from sqlalchemy import select, insert, delete, update
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select, delete, update, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncConnection
 from sqlalchemy.exc import IntegrityError
 
 from app.models import Genre
 from app.schemas import GenreCreate
-from app.utils import CrudException
+from app.utils import (
+    CrudException, contains, similarity, normalized, normalize_name, books_cache, genres_cache, genre_ids_cache
+)
 
 from .base import SQLAlchemyRepository
 
@@ -26,25 +29,30 @@ class GenresRepository(SQLAlchemyRepository):
     async def get_multiple(
             cls,
             connection: AsyncConnection,
-            name: Optional[str] = None
+            name: Optional[str] = None,
+            ranked: bool = False
     ) -> List[Genre]:
         query = select(Genre)
 
         if name is not None:
-            query = query.where(Genre.name.ilike(f"%{name}%"))
+            query = query.where(contains(Genre.name, name))
+            if ranked:
+                query = query.order_by(similarity(Genre.name, name).desc(), Genre.id)
 
         result = await connection.execute(query)
         return result.mappings().all()
 
     @classmethod
-    async def create(cls, connection: AsyncConnection, genre: GenreCreate) -> int:
-        """Создать нового автора"""
+    async def create(cls, connection: AsyncConnection, genre: GenreCreate) -> Optional[int]:
+        """Создать новый жанр. None, если жанр с таким же нормализованным именем уже существует"""
         result = await connection.execute(
-            insert(Genre)
-            .values(name=genre.name)
+            pg_insert(Genre)
+            .values(name=genre.name.strip())
+            .on_conflict_do_nothing(index_elements=[normalized(Genre.name)])
             .returning(Genre.id)
         )
-        return result.scalar_one()
+        await genres_cache.delete_prefix("list:")
+        return result.scalar_one_or_none()
 
     @classmethod
     async def get_existent_or_create(
@@ -52,17 +60,39 @@ class GenresRepository(SQLAlchemyRepository):
             connection: AsyncConnection,
             genre: GenreCreate
     ) -> int:
-        existing_genres = await cls.get_multiple(connection, name=genre.name)
+        ids = await cls.get_existent_or_create_many(connection, [genre.name])
+        return ids[normalize_name(genre.name)]
 
-        if existing_genres:
-            return existing_genres[0].id
+    @classmethod
+    async def get_existent_or_create_many(
+            cls,
+            connection: AsyncConnection,
+            names: Iterable[str]
+    ) -> Dict[str, int]:
+        """Ids of genres keyed by normalized names, missing ones are upserted in one statement"""
+        names = {normalize_name(name): name.strip() for name in names}
+        ids = {}
+        for key in names:
+            genre_id = await genre_ids_cache.get(key)
+            if genre_id is not None:
+                ids[key] = genre_id
 
-        result = await connection.execute(
-            insert(Genre)
-            .values(name=genre.name)
-            .returning(Genre.id)
-        )
-        return result.scalar_one()
+        missing = [{'name': name} for key, name in names.items() if key not in ids]
+        if missing:
+            result = await connection.execute(
+                pg_insert(Genre)
+                .values(missing)
+                .on_conflict_do_update(index_elements=[normalized(Genre.name)], set_={'name': Genre.name})
+                .returning(Genre.id, Genre.name, literal_column('xmax = 0').label('inserted'))
+            )
+            for row in result.all():
+                ids[normalize_name(row.name)] = row.id
+                # ids of rows inserted by this transaction are gone if it is rolled back
+                if row.inserted:
+                    await genres_cache.delete_prefix("list:")
+                else:
+                    await genre_ids_cache.set(normalize_name(row.name), row.id)
+        return ids
 
     @classmethod
     async def delete(cls, connection: AsyncConnection, genre_id: int) -> Optional[Genre]:
@@ -73,6 +103,9 @@ class GenresRepository(SQLAlchemyRepository):
                     delete(Genre)
                     .where(Genre.id == genre_id)
                 )
+                await genres_cache.delete(str(genre_id))
+                await genres_cache.delete_prefix("list:")
+                await genre_ids_cache.clear()
             return genre
         except IntegrityError as e:
             raise CrudException(
@@ -94,6 +127,11 @@ class GenresRepository(SQLAlchemyRepository):
                     .where(Genre.id == genre_id)
                     .values(name=genre.name)
                 )
+                await genres_cache.delete(str(genre_id))
+                await genres_cache.delete_prefix("list:")
+                await genre_ids_cache.clear()
+                # cached books carry the genre name
+                await books_cache.clear()
             return genre_in_db
         except IntegrityError as e:
             raise CrudException(
@@ -1,5 +1,6 @@
 import asyncio, re, io, nltk, pdfplumber, string, urllib.parse
 from concurrent.futures import ProcessPoolExecutor
+from elasticsearch.helpers import async_bulk
 from fastapi import HTTPException
 
 from app.repositories.storage import Storage
@@ -60,6 +61,32 @@ class Indexing:
         print("BOOK-PROCESSING: Finish indexing")
 
 
+    @staticmethod
+    def extract_book_file_text(genre: str, path: str) -> dict:
+        with open(path, 'rb') as file:
+            return Indexing.extract_book_text(genre, file.read())
+
+
+    @classmethod
+    async def index_books_bulk(cls, books: list[tuple[int, str | None, str]]):
+        """Indexes local PDFs of created books given as (book id, genre, path) with one bulk request"""
+        print(f"BOOK-PROCESSING: Start bulk process of {len(books)} books")
+        loop = asyncio.get_running_loop()
+        documents = await asyncio.gather(*[
+            loop.run_in_executor(Indexing.__executor, Indexing.extract_book_file_text, genre, path)
+            for _, genre, path in books
+        ])
+        actions = [
+            {"_index": elastic_cred.books_index, "_id": str(book_id), "_source": document}
+            for (book_id, _, _), document in zip(books, documents)
+        ]
+        try:
+            await async_bulk(_es, actions)
+        except Exception as e:
+            print(f"Indexation error: {e}")
+        print("BOOK-PROCESSING: Finish bulk indexing")
+
+
     @classmethod
     async def delete_book(cls, book_id: int):
         try:
@@ -1,18 +1,32 @@
 import datetime
+import random
 from typing import List, Optional
-from sqlalchemy import select, delete, update, insert
+from sqlalchemy import select, delete, update, func, case, cast, or_, tuple_, Float, FromClause, Select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncConnection
 
-from app.models import Review, Book
-from app.schemas import ReviewCreate, ReviewUpdate, ReviewsFiltersScheme, BookUpdate
+from app.models import Review, Book, BookRatingShard, User
+from app.settings import reviews_cred
+from app.schemas import (
+    ReviewCreate, ReviewUpdate, ReviewsFiltersScheme, ReviewsSortEnum, ReviewDetailed, BookRating, Page, SortOrderEnum,
+    RatingDrift
+)
+from app.utils import books_cache, encode_cursor, decode_cursor, keyset_condition, keyset_order
 
 from .base import SQLAlchemyRepository
-from .books import BooksRepository
 
 
 __all__ = ["ReviewsRepository"]
 
 
+_MARKS = range(1, 6)
+_HISTOGRAM_COLUMNS = [f'marks_{mark}' for mark in _MARKS]
+# counters kept per shard, marks_sum is folded into book's avg_mark on flush
+_RATING_COUNTERS = ['marks_count', 'marks_sum', *_HISTOGRAM_COLUMNS]
+_AVG_MARK_TOLERANCE = 1e-6
+
+
 class ReviewsRepository(SQLAlchemyRepository):
     @classmethod
     async def get(cls, connection: AsyncConnection, element_id: int) -> Optional[Review]:
@@ -35,132 +49,381 @@ class ReviewsRepository(SQLAlchemyRepository):
         if filters.owner_id is not None:
             query = query.where(Review.owner_id == filters.owner_id)
 
-        query = query.limit(filters.limit).offset(filters.offset)
+        query = query.order_by(Review.id).limit(filters.limit).offset(filters.offset)
 
         result = await connection.execute(query)
         return [review['id'] for review in result.mappings().all()]
 
 
     @classmethod
-    async def create(cls, connection: AsyncConnection, model: ReviewCreate, owner_id: int = None) -> Review:
-        book = await BooksRepository.get(connection, model.book_id)
-        if book is None:
-            raise ValueError("Book for review not found")
-
-        if await cls.check_review_by_user_and_book(connection, owner_id, book.id):
-            raise ValueError("Only one review for book from one user")
+    async def get_page(
+            cls,
+            connection: AsyncConnection,
+            book_id: Optional[int] = None,
+            owner_id: Optional[int] = None,
+            sort_by: ReviewsSortEnum = ReviewsSortEnum.ID,
+            order: SortOrderEnum = SortOrderEnum.ASC,
+            limit: int = 50,
+            cursor: Optional[str] = None
+    ) -> Page[ReviewDetailed]:
+        """Keyset page of full reviews with their owners' names in one query"""
+        sort_column = getattr(Review, sort_by.value)
+        descending = order == SortOrderEnum.DESC
+        query = (
+            select(Review.__table__, User.name.label('owner_name'))
+            .outerjoin(User, User.id == Review.owner_id)
+        )
+        if book_id is not None:
+            query = query.where(Review.book_id == book_id)
+        if owner_id is not None:
+            query = query.where(Review.owner_id == owner_id)
+
+        if cursor is not None:
+            cursor_sort, value, last_id = decode_cursor(cursor, 3)
+            if cursor_sort != sort_by.value:
+                raise ValueError("Cursor belongs to another sort field")
+            if sort_by == ReviewsSortEnum.LAST_EDIT_DATE and value is not None:
+                try:
+                    value = datetime.date.fromisoformat(value)
+                except (TypeError, ValueError):
+                    raise ValueError("Cursor is invalid")
+            query = query.where(keyset_condition(sort_column, value, Review.id, last_id, descending))
 
         result = await connection.execute(
-            insert(Review).values(
-                owner_id=owner_id,
-                book_id=model.book_id,
-                mark=model.mark,
-                text=model.text,
-                last_edit_date=datetime.date.today()
-            ).returning(Review.__table__)
+            query.order_by(*keyset_order(sort_column, Review.id, descending)).limit(limit + 1)
         )
-        review_data = result.mappings().first()
-        review = Review(**review_data)
+        rows = result.mappings().all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            value = rows[-1][sort_by.value]
+            if isinstance(value, datetime.date):
+                value = value.isoformat()
+            next_cursor = encode_cursor([sort_by.value, value, rows[-1]['id']])
+        return Page[ReviewDetailed](items=[ReviewDetailed(**row) for row in rows], next_cursor=next_cursor)
+
 
-        await cls._update_book_rating(connection, book, model.mark, increment=True)
-        return review
+    @classmethod
+    async def create(cls, connection: AsyncConnection, model: ReviewCreate, owner_id: int = None) -> Review:
+        # the unique (owner_id, book_id) index rejects a second review atomically, no probe needed
+        try:
+            result = await connection.execute(
+                pg_insert(Review).values(
+                    owner_id=owner_id,
+                    book_id=model.book_id,
+                    mark=model.mark,
+                    text=model.text,
+                    last_edit_date=datetime.date.today()
+                )
+                .on_conflict_do_nothing(index_elements=[Review.owner_id, Review.book_id])
+                .returning(Review.__table__)
+            )
+        except IntegrityError:
+            raise ValueError("Book for review not found")
+        review = result.mappings().first()
+        if review is None:
+            raise ValueError("Only one review for book from one user")
+
+        await cls._apply_rating_change(connection, model.book_id, added_mark=model.mark)
+        return Review(**review)
 
 
     @classmethod
     async def delete(cls, connection: AsyncConnection, review_id: int, owner_id: int = None) -> Review:
-        review = await cls.get(connection, review_id)
+        result = await connection.execute(
+            delete(Review)
+            .where(Review.id == review_id, Review.owner_id == owner_id)
+            .returning(Review.__table__)
+        )
+        review = result.mappings().first()
         if review is None:
-            raise ValueError("Review not found")
-        if review.owner_id != owner_id:
+            if await cls.get(connection, review_id) is None:
+                raise ValueError("Review not found")
             raise ValueError("It's not your review")
-        book = await BooksRepository.get(connection, review.book_id)
-        await connection.execute(delete(Review).where(Review.id == review_id))
-        await cls._update_book_rating(connection, book, review.mark, increment=False)
-        return review
+
+        await cls._apply_rating_change(connection, review['book_id'], removed_mark=review['mark'])
+        return Review(**review)
 
 
     @classmethod
     async def update(cls, connection: AsyncConnection, element_id: int, owner_id: int, model: ReviewUpdate) -> Review:
-        review = await cls.get(connection, element_id)
+        result = await connection.execute(
+            select(Review)
+            .where(Review.id == element_id)
+            .with_for_update()
+        )
+        review = result.mappings().first()
         if review is None:
             raise ValueError("Review not found")
         if review['owner_id'] != owner_id:
             raise ValueError("It's not your review")
-        update_values = model.model_dump(exclude_unset=True)
-
-        book = await BooksRepository.get(connection, review.book_id)
-        if model.mark is not None and model.mark != review['mark']:
-            old_mark = review['mark']
-            update_values['mark'] = model.mark
-            await cls._update_book_rating_change(connection, book, old_mark, model.mark)
-
-        if model.text is not None:
-            update_values['text'] = model.text
-
-        update_values['last_edit_date'] = datetime.date.today()
 
-        await connection.execute(
+        result = await connection.execute(
             update(Review)
             .where(Review.id == element_id)
-            .values(**update_values)
+            .values(**model.model_dump(exclude_unset=True), last_edit_date=datetime.date.today())
+            .returning(Review.__table__)
         )
+        updated_review = result.mappings().first()
 
-        result = await connection.execute(
-            select(Review)
-            .where(Review.id == element_id)
+        if updated_review['mark'] != review['mark']:
+            await cls._apply_rating_change(
+                connection, review['book_id'], added_mark=updated_review['mark'], removed_mark=review['mark']
+            )
+        return Review(**updated_review)
+
+
+    @staticmethod
+    def _rating_deltas(added_mark: Optional[int] = None, removed_mark: Optional[int] = None) -> dict:
+        """Changes of book rating counters (the columns of BookRatingShard) made by adding and/or removing a mark"""
+        deltas = dict.fromkeys(_RATING_COUNTERS, 0)
+        if added_mark is not None:
+            deltas['marks_count'] += 1
+            deltas['marks_sum'] += added_mark
+            deltas[f'marks_{added_mark}'] += 1
+        if removed_mark is not None:
+            deltas['marks_count'] -= 1
+            deltas['marks_sum'] -= removed_mark
+            deltas[f'marks_{removed_mark}'] -= 1
+        return deltas
+
+    @staticmethod
+    def _pending_ratings(source: FromClause, name: str) -> FromClause:
+        """Rating counters deltas of `source` shard rows summed per book"""
+        return (
+            select(source.c.book_id, *(func.sum(source.c[counter]).label(counter) for counter in _RATING_COUNTERS))
+            .group_by(source.c.book_id)
+            .cte(name)
         )
 
-        return Review(**result.mappings().first())
-
+    @staticmethod
+    def _moved_rating(deltas: dict) -> dict:
+        """book_table rating columns values moved by the counters deltas"""
+        marks_count = func.coalesce(Book.marks_count, 0)
+        new_marks_count = marks_count + deltas['marks_count']
+        new_avg_mark = case(
+            (new_marks_count == 0, 0.0),
+            else_=(func.coalesce(Book.avg_mark, 0.0) * marks_count + deltas['marks_sum']) / new_marks_count
+        )
+        values = {'avg_mark': new_avg_mark, 'marks_count': new_marks_count}
+        for column in _HISTOGRAM_COLUMNS:
+            values[column] = Book.__table__.c[column] + deltas[column]
+        return values
 
     @classmethod
-    async def check_review_by_user_and_book(cls, connection: AsyncConnection, owner_id: int, book_id: int) -> bool:
-        result = await connection.execute(
-            select(Review)
-            .where(
-                Review.owner_id == owner_id,
-                Review.book_id == book_id
-            )
-            .limit(1)
+    def _select_ratings(cls) -> Select:
+        """Books rating columns with pending marks of deferred mode merged in"""
+        pending = cls._pending_ratings(BookRatingShard.__table__, 'pending')
+        rating = cls._moved_rating({counter: func.coalesce(pending.c[counter], 0) for counter in _RATING_COUNTERS})
+        return (
+            select(Book.id, *(value.label(column) for column, value in rating.items()))
+            .outerjoin(pending, pending.c.book_id == Book.id)
         )
-        return result.scalar() is not None
 
 
     @classmethod
     async def get_average_mark(cls, connection: AsyncConnection, book_id: int) -> Optional[float]:
-        book = await BooksRepository.get(connection, book_id)
-        return book.avg_mark if book else None
+        rating = await cls.get_rating(connection, book_id)
+        return rating.avg_mark if rating else None
 
 
     @classmethod
     async def get_reviews_count(cls, connection: AsyncConnection, book_id: int) -> Optional[int]:
-        book = await BooksRepository.get(connection, book_id)
-        return book.marks_count if book else None
+        rating = await cls.get_rating(connection, book_id)
+        return rating.marks_count if rating else None
+
+
+    @classmethod
+    async def get_rating(cls, connection: AsyncConnection, book_id: int) -> Optional[BookRating]:
+        """Average mark, marks count and marks histogram of the book by primary key reads"""
+        result = await connection.execute(cls._select_ratings().where(Book.id == book_id))
+        rating = result.mappings().first()
+        return cls._to_rating(rating) if rating else None
 
 
     @classmethod
-    async def _update_book_rating(cls, connection: AsyncConnection, book: Book, mark: int, increment: bool = True):
-        current_avg = book.avg_mark
-        reviews_count_for_book = book.marks_count
-        if increment:
-            new_reviews_count = reviews_count_for_book + 1
-            new_avg = (current_avg * reviews_count_for_book + mark) / new_reviews_count
-        else:
-            new_reviews_count = reviews_count_for_book - 1
-            if new_reviews_count == 0:
-                new_avg = 0
-            else:
-                new_avg = (current_avg * reviews_count_for_book - mark) / new_reviews_count
-        await BooksRepository.update(
-            connection, book.id,
-            BookUpdate(**{'avg_mark': new_avg, 'marks_count': new_reviews_count})
+    async def get_ratings(
+            cls, connection: AsyncConnection, book_ids: List[int], owner_id: Optional[int] = None
+    ) -> List[BookRating]:
+        """
+        Ratings of several books in order of requested ids in one query, missing books are skipped.
+        With `owner_id` each rating also carries that user's mark, looked up by the (owner_id, book_id) index
+        """
+        query = cls._select_ratings().where(Book.id.in_(book_ids))
+        if owner_id is not None:
+            query = query.add_columns(Review.mark.label('my_mark')).outerjoin(
+                Review, (Review.book_id == Book.id) & (Review.owner_id == owner_id)
+            )
+        result = await connection.execute(query)
+        ratings = {rating['id']: cls._to_rating(rating) for rating in result.mappings().all()}
+        return [ratings[book_id] for book_id in dict.fromkeys(book_ids) if book_id in ratings]
+
+    @staticmethod
+    def _to_rating(rating) -> BookRating:
+        return BookRating(
+            book_id=rating['id'],
+            avg_mark=rating['avg_mark'],
+            marks_count=rating['marks_count'],
+            histogram={mark: rating[f'marks_{mark}'] for mark in _MARKS},
+            my_mark=rating.get('my_mark')
         )
 
 
     @classmethod
-    async def _update_book_rating_change(cls, connection: AsyncConnection, book: Book, old_mark: int, new_mark: int):
-        current_avg = book.avg_mark or 0
-        reviews_count = book.marks_count or 0
-        new_avg = (current_avg * reviews_count - old_mark + new_mark) / reviews_count
+    async def get_book_ids_batch(
+            cls, connection: AsyncConnection, after_id: int, limit: int, book_ids: Optional[List[int]] = None
+    ) -> List[int]:
+        query = select(Book.id).where(Book.id > after_id)
+        if book_ids is not None:
+            query = query.where(Book.id.in_(book_ids))
+        result = await connection.execute(query.order_by(Book.id).limit(limit))
+        return list(result.scalars().all())
 
-        await BooksRepository.update(connection, book.id, BookUpdate(**{'avg_mark': new_avg}))
+
+    @classmethod
+    async def reconcile_ratings(cls, connection: AsyncConnection, book_ids: List[int]) -> List[RatingDrift]:
+        """
+        Recomputes rating columns of the books from review_table in one set-based UPDATE.
+        Only drifted rows are written (and locked). Marks still pending in shards are kept out
+        of the stored values, since reads add them on top. Returns the drift of every rewritten book
+        """
+        actual = (
+            select(
+                Review.book_id,
+                func.count().label('marks_count'),
+                func.sum(Review.mark).label('marks_sum'),
+                *(func.count().filter(Review.mark == mark).label(f'marks_{mark}') for mark in _MARKS)
+            )
+            .where(Review.book_id.in_(book_ids))
+            .group_by(Review.book_id)
+            .subquery('actual')
+        )
+        pending = cls._pending_ratings(
+            select(BookRatingShard).where(BookRatingShard.book_id.in_(book_ids)).subquery(), 'pending'
+        )
+        stored = {
+            counter: func.coalesce(actual.c[counter], 0) - func.coalesce(pending.c[counter], 0)
+            for counter in _RATING_COUNTERS
+        }
+        target = (
+            select(
+                Book.id.label('book_id'),
+                Book.avg_mark.label('old_avg_mark'),
+                Book.marks_count.label('old_marks_count'),
+                case(
+                    (stored['marks_count'] == 0, 0.0),
+                    else_=cast(stored['marks_sum'], Float) / stored['marks_count']
+                ).label('avg_mark'),
+                *(value.label(counter) for counter, value in stored.items() if counter != 'marks_sum')
+            )
+            .select_from(Book)
+            .outerjoin(actual, actual.c.book_id == Book.id)
+            .outerjoin(pending, pending.c.book_id == Book.id)
+            .where(Book.id.in_(book_ids))
+            .subquery('target')
+        )
+        drifted = or_(
+            Book.avg_mark.is_(None),
+            func.abs(Book.avg_mark - target.c.avg_mark) > _AVG_MARK_TOLERANCE,
+            *(Book.__table__.c[column].is_distinct_from(target.c[column])
+              for column in ['marks_count', *_HISTOGRAM_COLUMNS])
+        )
+        result = await connection.execute(
+            update(Book)
+            .where(Book.id == target.c.book_id, drifted)
+            .values(
+                avg_mark=target.c.avg_mark,
+                marks_count=target.c.marks_count,
+                **{column: target.c[column] for column in _HISTOGRAM_COLUMNS}
+            )
+            .returning(
+                Book.id, target.c.old_avg_mark, target.c.old_marks_count, Book.avg_mark, Book.marks_count
+            )
+        )
+        drifts = [
+            RatingDrift(
+                book_id=row.id,
+                avg_mark_before=row.old_avg_mark,
+                avg_mark_after=row.avg_mark,
+                marks_count_before=row.old_marks_count,
+                marks_count_after=row.marks_count
+            )
+            for row in result.all()
+        ]
+        for drift in drifts:
+            await books_cache.delete(str(drift.book_id))
+        return drifts
+
+
+    @classmethod
+    async def flush_rating_shards(cls, connection: AsyncConnection, limit: int) -> int:
+        """Folds up to `limit` pending shard rows into books in one statement, returns the number of updated books"""
+        drained = (
+            delete(BookRatingShard)
+            .where(
+                tuple_(BookRatingShard.book_id, BookRatingShard.shard).in_(
+                    select(BookRatingShard.book_id, BookRatingShard.shard)
+                    .limit(limit)
+                    .with_for_update(skip_locked=True)
+                )
+            )
+            .returning(BookRatingShard.book_id, *(BookRatingShard.__table__.c[c] for c in _RATING_COUNTERS))
+            .cte('drained')
+        )
+        pending = cls._pending_ratings(drained, 'pending')
+        result = await connection.execute(
+            update(Book)
+            .where(Book.id == pending.c.book_id)
+            .values(**cls._moved_rating({counter: pending.c[counter] for counter in _RATING_COUNTERS}))
+            .returning(Book.id)
+        )
+        book_ids = result.scalars().all()
+        for book_id in book_ids:
+            await books_cache.delete(str(book_id))
+        return len(book_ids)
+
+
+    @classmethod
+    async def _apply_rating_change(
+            cls,
+            connection: AsyncConnection,
+            book_id: int,
+            added_mark: Optional[int] = None,
+            removed_mark: Optional[int] = None
+    ) -> bool:
+        """
+        Moves avg_mark, marks_count and the histogram of the book by added and/or removed mark in one UPDATE.
+        The new values are computed from the row version current at the moment of locking it,
+        so concurrent reviews never lose updates. In deferred mode the change is added to one of
+        the book's counter shards instead, so hot books don't serialize on their row lock.
+        Returns False when the book doesn't exist.
+        """
+        deltas = cls._rating_deltas(added_mark, removed_mark)
+
+        if reviews_cred.rating_mode == "deferred":
+            statement = pg_insert(BookRatingShard).values(
+                book_id=book_id, shard=random.randrange(reviews_cred.rating_shards), **deltas
+            )
+            try:
+                await connection.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[BookRatingShard.book_id, BookRatingShard.shard],
+                        set_={
+                            counter: BookRatingShard.__table__.c[counter] + statement.excluded[counter]
+                            for counter in _RATING_COUNTERS
+                        }
+                    )
+                )
+            except IntegrityError:
+                return False
+            return True
+
+        result = await connection.execute(
+            update(Book)
+            .where(Book.id == book_id)
+            .values(**cls._moved_rating(deltas))
+            .returning(Book.id)
+        )
+        await books_cache.delete(str(book_id))
+        return result.first() is not None
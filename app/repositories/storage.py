@@ -1,74 +1,256 @@
+import asyncio
+import hashlib
 import os
-from typing import AsyncGenerator, Any
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import AsyncGenerator, AsyncIterator, Any, BinaryIO, List, Optional
 from fastapi import UploadFile, HTTPException
-from minio.datatypes import BaseHTTPResponse
+from minio.datatypes import BaseHTTPResponse, Object
 from minio.error import S3Error
-from minio.helpers import ObjectWriteResult
+from minio.commonconfig import ComposeSource
 
-from app.settings import minio_client, minio_cred
+from app.settings import minio_client, minio_presign_client, minio_cred
 
 
 __all__ = ["Storage"]
 
 
+# user metadata of objects with the name the file was uploaded with
+_ORIGINAL_NAME = "original-name"
+# streamed uploads wait here until their content hash is known
+_INCOMING_PREFIX = "incoming/"
+
+
+class _AsyncBodyReader:
+    """
+    Blocking file-like view of an async byte stream for minio running in a thread: each read
+    takes the next chunk from the event loop. Hashes the bytes and stops the upload past `max_size`
+    """
+    def __init__(self, chunks: AsyncIterator[bytes], max_size: int, loop: asyncio.AbstractEventLoop):
+        self.__chunks = chunks
+        self.__max_size = max_size
+        self.__loop = loop
+        self.__buffer = b""
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    async def __next_chunk(self) -> bytes:
+        return await anext(self.__chunks, b"")
+
+    def read(self, size: int = -1) -> bytes:
+        while not self.__buffer:
+            chunk = asyncio.run_coroutine_threadsafe(self.__next_chunk(), self.__loop).result()
+            if not chunk:
+                return b""
+            self.size += len(chunk)
+            if self.size > self.__max_size:
+                raise ValueError(f"File is larger than {self.__max_size} bytes")
+            self.sha256.update(chunk)
+            self.__buffer = chunk
+        if size < 0:
+            size = len(self.__buffer)
+        data, self.__buffer = self.__buffer[:size], self.__buffer[size:]
+        return data
+
+
 class Storage:
+    """
+    MinIO calls block, so each of them runs in a dedicated executor. Its size bounds the requests
+    in flight to MinIO per worker, the event loop never waits on the network.
+    """
+    __executor = ThreadPoolExecutor(max_workers=minio_cred.io_workers, thread_name_prefix="storage")
+    # streaming uploads hold a thread for their whole duration, so they don't take the short calls' threads
+    __upload_executor = ThreadPoolExecutor(max_workers=minio_cred.upload_workers, thread_name_prefix="storage-upload")
+
     @classmethod
-    def is_file_exists(cls, path_to_object: str) -> bool:
+    async def __run(cls, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(cls.__executor, function, *args)
+
+
+    @classmethod
+    def __stat_object(cls, path_to_object: str) -> Optional[Object]:
         try:
-            return minio_client.stat_object(minio_cred.bucket_name, path_to_object) is not None
+            return minio_client.stat_object(minio_cred.bucket_name, path_to_object)
         except S3Error as _:
-            return False
+            return None
+
+
+    @classmethod
+    async def get_file_info(cls, path_to_object: str) -> Optional[Object]:
+        return await cls.__run(cls.__stat_object, path_to_object)
 
 
     @classmethod
-    def __brute_force_path_select(cls, filename: str | None) -> str:
-        if filename is None:
+    async def is_file_exists(cls, path_to_object: str) -> bool:
+        return await cls.get_file_info(path_to_object) is not None
+
+
+    @staticmethod
+    def content_key(sha256: str, filename: str) -> str:
+        """Object name of a file: its content hash, so identical files share one object"""
+        return f"{sha256}{os.path.splitext(filename)[1].lower()}"
+
+
+    @staticmethod
+    def original_name(file_info: Object) -> str:
+        """Name the file was uploaded with, kept in object metadata since the object is named by its hash"""
+        quoted_name = (file_info.metadata or {}).get(f"x-amz-meta-{_ORIGINAL_NAME}")
+        return urllib.parse.unquote(quoted_name) if quoted_name else os.path.basename(file_info.object_name)
+
+
+    @staticmethod
+    def __metadata(filename: str) -> dict:
+        return {_ORIGINAL_NAME: urllib.parse.quote(os.path.basename(filename))}
+
+
+    @staticmethod
+    def __hash_file(file: BinaryIO) -> str:
+        sha256 = hashlib.sha256()
+        while chunk := file.read(minio_cred.stream_chunk_size):
+            sha256.update(chunk)
+        file.seek(0)
+        return sha256.hexdigest()
+
+
+    @classmethod
+    def __hash_local_file(cls, local_path: str) -> str:
+        with open(local_path, "rb") as file:
+            return cls.__hash_file(file)
+
+
+    @classmethod
+    async def upload_file_to_s3(cls, file: UploadFile) -> str:
+        """Stores the file unless an identical one is already stored, returns its object name"""
+        if file.filename is None:
             raise HTTPException(status_code=415, detail="The uploaded file must have a name")
-        path = filename
-        name, extension = os.path.splitext(filename)
-        index = 0
-        while cls.is_file_exists(path):
-            index += 1
-            path = f"{name}_{index}{extension}"
-        return path
+        try:
+            object_path = cls.content_key(await cls.__run(cls.__hash_file, file.file), file.filename)
+            if not await cls.is_file_exists(object_path):
+                await cls.__run(lambda: minio_client.put_object(
+                    minio_cred.bucket_name, object_path, file.file, file.size,
+                    content_type=file.content_type or "application/octet-stream",
+                    metadata=cls.__metadata(file.filename)
+                ))
+            return object_path
+        except Exception as e:
+            raise HTTPException(409, f"Failed to upload file: {str(e)}")
+
+
+    @classmethod
+    async def upload_stream(
+            cls, chunks: AsyncIterator[bytes], max_size: int, content_type: str
+    ) -> tuple[str, int, str]:
+        """
+        Streams the chunks into a multipart upload of `upload_part_size` parts without spooling them.
+        The content hash is known only at the end, so the object goes to a temporary name to be
+        passed to `store_upload`. Any error of the stream (too large, client disconnect) aborts
+        the multipart upload. Returns the temporary object name, the size and SHA-256
+        """
+        loop = asyncio.get_running_loop()
+        reader = _AsyncBodyReader(chunks, max_size, loop)
+        temporary_path = f"{_INCOMING_PREFIX}{uuid.uuid4().hex}"
+        await loop.run_in_executor(
+            cls.__upload_executor,
+            lambda: minio_client.put_object(
+                minio_cred.bucket_name, temporary_path, reader, length=-1,
+                content_type=content_type, part_size=minio_cred.upload_part_size
+            )
+        )
+        return temporary_path, reader.size, reader.sha256.hexdigest()
 
 
     @classmethod
-    def upload_file_to_s3(cls, file: UploadFile) -> ObjectWriteResult:
+    async def store_upload(cls, temporary_path: str, sha256: str, filename: str) -> str:
+        """Moves a streamed upload to its content address (server-side), or drops it as a duplicate"""
+        object_path = cls.content_key(sha256, filename)
         try:
-            file_path = cls.__brute_force_path_select(file.filename)
-            return minio_client.put_object(minio_cred.bucket_name, file_path, file.file, file.size)
+            if not await cls.is_file_exists(object_path):
+                await cls.__run(lambda: minio_client.compose_object(
+                    minio_cred.bucket_name, object_path,
+                    [ComposeSource(minio_cred.bucket_name, temporary_path)],
+                    metadata=cls.__metadata(filename)
+                ))
+        finally:
+            await cls.delete_file_in_s3(temporary_path)
+        return object_path
+
+
+    @classmethod
+    async def upload_local_file(cls, local_path: str) -> str:
+        """Stores the local file unless an identical one is already stored, returns its object name"""
+        try:
+            object_path = cls.content_key(await cls.__run(cls.__hash_local_file, local_path), local_path)
+            if not await cls.is_file_exists(object_path):
+                await cls.__run(lambda: minio_client.fput_object(
+                    minio_cred.bucket_name, object_path, local_path, metadata=cls.__metadata(local_path)
+                ))
+            return object_path
         except Exception as e:
             raise HTTPException(409, f"Failed to upload file: {str(e)}")
 
+    @classmethod
+    def presigned_upload_url(cls, object_path: str) -> str:
+        """Short-lived URL a client PUTs the object to"""
+        return minio_presign_client.presigned_put_object(
+            minio_cred.bucket_name, object_path, expires=timedelta(seconds=minio_cred.presigned_ttl)
+        )
+
+    @classmethod
+    def presigned_download_url(cls, full_path: str, filename: str) -> str:
+        """Short-lived URL of the object, downloaded as an attachment named `filename`"""
+        filename = urllib.parse.quote(filename)
+        return minio_presign_client.presigned_get_object(
+            minio_cred.bucket_name, full_path, expires=timedelta(seconds=minio_cred.presigned_ttl),
+            response_headers={"response-content-disposition": f"attachment; filename={filename}"}
+        )
+
     # получить файл из ссылки: file_stream_generator(urllib.parse.unquote(book.pdf_qname))
     @classmethod
-    async def file_stream_generator(cls, full_path: str) -> AsyncGenerator[bytes, Any]:
-        file_response: BaseHTTPResponse = minio_client.get_object(minio_cred.bucket_name, full_path)
+    async def file_stream_generator(
+            cls, full_path: str, offset: int = 0, length: int = 0
+    ) -> AsyncGenerator[bytes, Any]:
+        """Object bytes from `offset`, `length` of them or all the rest when 0"""
+        file_response: BaseHTTPResponse = await cls.__run(
+            minio_client.get_object, minio_cred.bucket_name, full_path, offset, length
+        )
         try:
-            for chunk in file_response.stream():
+            # a reader holds a pooled connection between chunks, but an executor thread only while reading one
+            chunks = file_response.stream(minio_cred.stream_chunk_size)
+            while (chunk := await cls.__run(next, chunks, None)) is not None:
                 yield chunk
         finally:
             file_response.close()
             file_response.release_conn()
 
 
+    @classmethod
+    def __read_object(cls, full_path: str) -> bytes:
+        file_response: BaseHTTPResponse = minio_client.get_object(minio_cred.bucket_name, full_path)
+        try:
+            return file_response.read()
+        finally:
+            file_response.close()
+            file_response.release_conn()
+
+
     @classmethod
     async def download_file_bytes(cls, full_path: str) -> bytes:
-        data = bytearray()
-        async for chunk in cls.file_stream_generator(full_path):
-            data.extend(chunk)
-        return bytes(data)
+        return await cls.__run(cls.__read_object, full_path)
 
 
     @classmethod
-    def list_files_in_s3(cls):
-        return minio_client.list_objects(minio_cred.bucket_name)
+    async def list_files_in_s3(cls) -> List[Object]:
+        # top-level listing, streamed uploads waiting under the incoming/ prefix are left out
+        return await cls.__run(
+            lambda: [obj for obj in minio_client.list_objects(minio_cred.bucket_name) if not obj.is_dir]
+        )
 
 
     @classmethod
-    def delete_file_in_s3(cls, filename: str):
+    async def delete_file_in_s3(cls, filename: str):
         try:
-            minio_client.remove_object(minio_cred.bucket_name, filename)
+            await cls.__run(minio_client.remove_object, minio_cred.bucket_name, filename)
         except Exception as e:
             raise HTTPException(409, f"Failed to delete file: {str(e)}")
@@ -1,10 +1,13 @@
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncConnection
-from sqlalchemy import select, insert, update, delete
+from sqlalchemy import select, update, delete, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.models import User
-from app.schemas import UserRegister, UserLogin, PrivilegesEnum, UserUpdate
-from app.utils import get_password_hash, verify_password
+from app.schemas import UserRegister, UserLogin, PrivilegesEnum, UserUpdate, Page, User as UserScheme
+from app.utils import (
+    get_password_hash, verify_and_update_password, starts_with, encode_cursor, decode_cursor, principals_cache
+)
 
 from .base import SQLAlchemyRepository
 
@@ -25,37 +28,48 @@ class UsersRepository(SQLAlchemyRepository):
         return result.mappings().first()
 
     @classmethod
-    async def get_multiple(cls, connection: AsyncConnection, username=None, email=None):
+    async def get_multiple(
+            cls, connection: AsyncConnection, search: str = None, limit: int = 50, cursor: str = None
+    ) -> Page[UserScheme]:
+        """Keyset page of users ordered by id, maybe filtered by name or email prefix"""
         query = select(
             User.id,
             User.email,
             User.name,
             User.privileges
         )
-        if username:
-            query = query.where(User.name.ilike(f"%{username}%"))
-        if email:
-            query = query.where(User.email.ilike(f"%{email}%"))
+        if search:
+            query = query.where(or_(starts_with(User.name, search), starts_with(User.email, search)))
+        if cursor is not None:
+            _, last_id = decode_cursor(cursor, 2)
+            query = query.where(User.id > last_id)
 
-        result = await connection.execute(query)
-        return result.mappings().all()
+        result = await connection.execute(query.order_by(User.id).limit(limit + 1))
+        users = result.mappings().all()
+
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(["id", users[-1]['id']])
+        return Page[UserScheme](items=[UserScheme(**user) for user in users], next_cursor=next_cursor)
 
     @classmethod
     async def create(cls, connection: AsyncConnection, model: UserRegister):
-        query = select(User).where(User.email == model.email)
-        result = await connection.execute(query)
-        result = result.first()
-        if result:
-            raise HTTPException(status_code=409, detail="User already exists")
-
         user_dict = model.model_dump()
-        user_dict["password_hash"] = get_password_hash(model.password)
+        user_dict["password_hash"] = await get_password_hash(model.password)
         user_dict['privileges'] = "basic"
         user_dict.pop("password")
 
-        stmt = insert(User).values(**user_dict).returning(User.id)
+        # the unique lower(email) index makes concurrent registrations with one email safe
+        stmt = (
+            pg_insert(User).values(**user_dict)
+            .on_conflict_do_nothing(index_elements=[func.lower(User.email)])
+            .returning(User.id)
+        )
         result = await connection.execute(stmt)
-        user_id = result.scalar_one()
+        user_id = result.scalar()
+        if user_id is None:
+            raise HTTPException(status_code=409, detail="User already exists")
 
         if user_id == 1:
             await cls.set_role_for_user(connection, PrivilegesEnum.ADMIN, 1)
@@ -70,6 +84,7 @@ class UsersRepository(SQLAlchemyRepository):
         if user:
             query = delete(User).where(User.id == element_id)
             await connection.execute(query)
+            await principals_cache.delete_prefix(f"{element_id}:")
         return user
 
     @classmethod
@@ -85,11 +100,12 @@ class UsersRepository(SQLAlchemyRepository):
                 user_new_dict[key] = value
 
         if model.password is not None:
-            user_new_dict["password_hash"] = get_password_hash(model.password)
+            user_new_dict["password_hash"] = await get_password_hash(model.password)
         user_new_dict.pop("password")
 
         query = update(User).where(User.id == element_id).values(**user_new_dict)
         await connection.execute(query)
+        await principals_cache.delete_prefix(f"{element_id}:")
 
         user = await cls.get(connection, element_id)
         return user
@@ -102,14 +118,19 @@ class UsersRepository(SQLAlchemyRepository):
 
         query = update(User).where(User.id == user_id).values(privileges=privilege)
         await connection.execute(query)
+        await principals_cache.delete_prefix(f"{user_id}:")
         return await cls.get(connection, user_id)
 
     @classmethod
     async def login(cls, connection: AsyncConnection, user_data: UserLogin):
-        query = select(User).where(User.email == user_data.email)
+        query = select(User).where(func.lower(User.email) == user_data.email.lower())
         result = await connection.execute(query)
-        print(result.keys())
         user = result.mappings().first()
-        if not user or not verify_password(user_data.password, user["password_hash"]):
+        if not user:
+            return None
+        is_valid, new_hash = await verify_and_update_password(user_data.password, user["password_hash"])
+        if not is_valid:
             return None
+        if new_hash is not None:
+            await connection.execute(update(User).where(User.id == user["id"]).values(password_hash=new_hash))
         return user
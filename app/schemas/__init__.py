@@ -1,6 +1,8 @@
 from .authors import *
 from .books import *
 from .genres import *
+from .metrics import *
+from .pagination import *
 from .users import *
 from .storage import *
 from .reviews import *
\ No newline at end of file
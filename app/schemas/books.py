@@ -1,7 +1,32 @@
-from typing import Optional
+from enum import Enum
+from typing import List, Optional
+from pydantic import Field
 from .base import CamelCaseBaseModel
 
-__all__ = ["Book", "BookCreate", "BookUpdate", "BookIndex"]
+__all__ = [
+    "Book", "BookCreate", "BookUpdate", "BookIndex", "BooksFiltersScheme", "BooksSortEnum", "FacetCount", "BooksFacets",
+    "BookManifestRow", "BooksImport", "BooksImportReport"
+]
+
+
+class BooksSortEnum(str, Enum):
+    ID = "id"
+    TITLE = "title"
+    PUBLISHED_DATE = "published_date"
+    AVG_MARK = "avg_mark"
+    MARKS_COUNT = "marks_count"
+    RELEVANCE = "relevance"
+
+
+class BooksFiltersScheme(CamelCaseBaseModel):
+    theme_id: Optional[int] = None
+    title: Optional[str] = None
+    author: Optional[str] = None
+    genre: Optional[str] = None
+    published_date: Optional[int] = None
+    description: Optional[str] = None
+    min_mark: Optional[float] = None
+    max_mark: Optional[float] = None
 
 
 class BookCreate(CamelCaseBaseModel):
@@ -36,4 +61,42 @@ class BookIndex(CamelCaseBaseModel):
 
 
 class Book(BookCreate):
-    id: int
\ No newline at end of file
+    id: int
+
+
+class FacetCount(CamelCaseBaseModel):
+    value: Optional[str | int] = None
+    count: int
+
+
+class BooksFacets(CamelCaseBaseModel):
+    authors: List[FacetCount] = []
+    genres: List[FacetCount] = []
+    published_dates: List[FacetCount] = []
+    marks: List[FacetCount] = []
+
+
+class BookManifestRow(CamelCaseBaseModel):
+    theme_id: int
+    title: str
+    author: str
+    genre: Optional[str] = None
+    published_date: Optional[int] = None
+    description: Optional[str] = None
+    pdf_file: str
+    image_file: Optional[str] = None
+
+
+class BooksImport(CamelCaseBaseModel):
+    manifest_path: str = Field(description="JSONL or CSV manifest on the server")
+    files_dir: str = Field(description="Directory the manifest's file paths are relative to")
+    batch_size: int = Field(100, gt=0, le=1000)
+    concurrency: int = Field(8, gt=0, le=64, description="Files uploaded at once")
+
+
+class BooksImportReport(CamelCaseBaseModel):
+    imported: int
+    skipped: int
+    seconds: float
+    books_per_second: float
+    megabytes_per_second: float
@@ -0,0 +1,17 @@
+from typing import Optional
+
+from .base import CamelCaseBaseModel
+
+__all__ = ["CacheStats", "LimiterStats"]
+
+
+class CacheStats(CamelCaseBaseModel):
+    hits: int
+    misses: int
+    hit_ratio: float
+
+
+class LimiterStats(CamelCaseBaseModel):
+    allowed: int
+    rejected: int
+    in_flight: Optional[int] = None
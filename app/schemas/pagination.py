@@ -0,0 +1,25 @@
+from enum import Enum
+from typing import Generic, List, Optional, TypeVar
+
+from .base import CamelCaseBaseModel
+
+__all__ = ["Page", "SortOrderEnum", "CountModeEnum"]
+
+
+T = TypeVar("T")
+
+
+class SortOrderEnum(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+class CountModeEnum(str, Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+
+
+class Page(CamelCaseBaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
@@ -1,11 +1,20 @@
 from datetime import date
-from typing import Optional
+from enum import Enum
+from typing import Dict, List, Optional
 
 from pydantic import Field
 
 from .base import CamelCaseBaseModel
 
-__all__ = ["ReviewsFiltersScheme", "ReviewUpdate", "ReviewCreate", "Review"]
+__all__ = [
+    "ReviewsFiltersScheme", "ReviewUpdate", "ReviewCreate", "Review", "ReviewDetailed", "ReviewsSortEnum", "BookRating",
+    "RatingDrift", "RatingsReconciliation", "RatingsReconciliationReport"
+]
+
+
+class ReviewsSortEnum(str, Enum):
+    ID = "id"
+    LAST_EDIT_DATE = "last_edit_date"
 
 
 class ReviewsFiltersScheme(CamelCaseBaseModel):
@@ -28,3 +37,35 @@ class Review(ReviewCreate):
     id: int
     owner_id: int
     last_edit_date: date
+
+
+class ReviewDetailed(Review):
+    owner_name: Optional[str] = None
+
+
+class BookRating(CamelCaseBaseModel):
+    book_id: int
+    avg_mark: float
+    marks_count: int
+    histogram: Dict[int, int] = Field(description="Number of reviews for each mark from 1 to 5")
+    my_mark: Optional[int] = Field(None, description="Mark of the current user, if any")
+
+
+class RatingDrift(CamelCaseBaseModel):
+    book_id: int
+    avg_mark_before: Optional[float] = None
+    avg_mark_after: float
+    marks_count_before: Optional[int] = None
+    marks_count_after: int
+
+
+class RatingsReconciliation(CamelCaseBaseModel):
+    book_ids: Optional[List[int]] = Field(None, description="Books to check, all of them otherwise")
+    batch_size: int = Field(1000, gt=0, le=10000, description="Books recomputed per transaction")
+
+
+class RatingsReconciliationReport(CamelCaseBaseModel):
+    checked: int
+    drifted: int
+    seconds: float
+    drifts: List[RatingDrift]
@@ -1,7 +1,35 @@
+from typing import Optional
+
+from pydantic import Field
+
 from .base import CamelCaseBaseModel
 
-__all__ = ["FileUploadedScheme"]
+__all__ = [
+    "FileUploadedScheme", "PresignedUploadRequest", "PresignedUpload", "FileUploadCompletion", "FileStreamUploaded"
+]
 
 
 class FileUploadedScheme(CamelCaseBaseModel):
     qname: str
+
+
+class PresignedUploadRequest(CamelCaseBaseModel):
+    filename: str = Field(min_length=1)
+    sha256: str = Field(pattern=r"^[0-9a-fA-F]{64}$", description="SHA-256 of the file, hex")
+
+
+class PresignedUpload(FileUploadedScheme):
+    url: Optional[str] = Field(None, description="URL to PUT the file to, none if the same file is already stored")
+    expires_in: int = Field(0, description="Seconds the URL is valid for")
+
+
+class FileUploadCompletion(CamelCaseBaseModel):
+    qname: str
+    book_id: Optional[int] = Field(None, description="Book the uploaded PDF is attached to and indexed for")
+
+
+class FileStreamUploaded(FileUploadedScheme):
+    size: int
+    sha256: str
+    seconds: float
+    megabytes_per_second: float
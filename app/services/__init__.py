@@ -2,6 +2,8 @@ from .authors import *
 from .books import *
 from .search import *
 from .genres import *
+from .importing import *
+from .metrics import *
 from .reviews import *
 from .storage import *
 from .users import *
\ No newline at end of file
@@ -3,7 +3,7 @@ from fastapi import HTTPException
 
 from app.repositories import AuthorsRepository
 from app.schemas import Author, AuthorCreate
-from app.utils import CrudException, UnitOfWork
+from app.utils import CrudException, UnitOfWork, authors_cache
 
 
 __all__ = ["AuthorService"]
@@ -11,28 +11,37 @@ __all__ = ["AuthorService"]
 
 class AuthorService:
     @staticmethod
-    async def get_authors(name: Optional[str], uow: UnitOfWork) -> List[Author]:
+    async def get_authors(name: Optional[str], ranked: bool, uow: UnitOfWork) -> List[Author]:
+        key = f"list:{ranked}:{name!r}"
+        cached = await authors_cache.get(key)
+        if cached is not None:
+            return [Author.model_validate(author) for author in cached]
         async with uow.begin():
-            authors = await AuthorsRepository.get_multiple(uow.get_connection(), name)
+            authors = await AuthorsRepository.get_multiple(uow.get_connection(), name, ranked)
             if authors is None:
                 raise HTTPException(status_code=404, detail="Author not found")
-            return authors
+        authors = [Author.model_validate(dict(author)) for author in authors]
+        await authors_cache.set(key, [author.model_dump(mode='json') for author in authors])
+        return authors
 
     @staticmethod
     async def get_author(author_id: int, uow: UnitOfWork) -> Author:
+        cached = await authors_cache.get(str(author_id))
+        if cached is not None:
+            return Author.model_validate(cached)
         async with uow.begin():
             author = await AuthorsRepository.get(uow.get_connection(), author_id)
             if author is None:
                 raise HTTPException(status_code=404, detail="Author not found")
-            return author
+        author = Author.model_validate(dict(author))
+        await authors_cache.set(str(author_id), author.model_dump(mode='json'))
+        return author
 
     @staticmethod
     async def create_author(author: AuthorCreate, uow: UnitOfWork) -> int:
         async with uow.begin():
-            key = await AuthorsRepository.get_multiple(uow.get_connection(), name=author.name)
-            if len(key) == 0:
-                key = await AuthorsRepository.create(uow.get_connection(), author)
-            else:
+            key = await AuthorsRepository.create(uow.get_connection(), author)
+            if key is None:
                 raise HTTPException(status_code=409, detail="Author already exists")
             await uow.get_connection().commit()
             return key
@@ -2,8 +2,11 @@ from typing import Optional, List
 from fastapi import HTTPException, BackgroundTasks
 
 from app.repositories import BooksRepository, Indexing
-from app.schemas import Book, BookCreate, BookUpdate, BookIndex
-from app.utils import UnitOfWork
+from app.schemas import (
+    Book, BookCreate, BookUpdate, BookIndex, BooksFiltersScheme, BooksSortEnum, BooksFacets, Page, SortOrderEnum,
+    CountModeEnum
+)
+from app.utils import UnitOfWork, books_cache, facets_cache
 
 
 __all__ = ["BookService"]
@@ -12,30 +15,53 @@ __all__ = ["BookService"]
 class BookService:
     @staticmethod
     async def get_books(
-            title: Optional[str],
-            author: Optional[str],
-            genre: Optional[str],
-            published_date: Optional[int],
-            description: Optional[str],
-            min_mark: Optional[float],
-            max_mark: Optional[float],
+            filters: BooksFiltersScheme,
+            sort_by: BooksSortEnum,
+            order: SortOrderEnum,
+            limit: int,
+            cursor: Optional[str],
+            count: Optional[CountModeEnum],
             uow: UnitOfWork
-    ) -> List[int]:
+    ) -> Page[int]:
         async with uow.begin():
-            books = await BooksRepository.get_multiple(
-                uow.get_connection(),
-                title, author, genre, published_date, description, min_mark, max_mark
-            )
-            return books
+            try:
+                return await BooksRepository.get_multiple(
+                    uow.get_connection(), filters, sort_by, order, limit, cursor, count
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+
+    @staticmethod
+    async def get_facets(filters: BooksFiltersScheme, fresh: bool, uow: UnitOfWork) -> BooksFacets:
+        key = filters.model_dump_json()
+        if not fresh:
+            facets = await facets_cache.get(key)
+            if facets is not None:
+                return BooksFacets.model_validate(facets)
+        async with uow.begin():
+            facets = await BooksRepository.get_facets(uow.get_connection(), filters)
+        await facets_cache.set(key, facets.model_dump(mode='json'))
+        return facets
 
 
     @staticmethod
     async def get_book(book_id: int, uow: UnitOfWork) -> Book:
+        cached = await books_cache.get(str(book_id))
+        if cached is not None:
+            return Book.model_validate(cached)
         async with uow.begin():
             result = await BooksRepository.get(uow.get_connection(), book_id)
             if result is None:
                 raise HTTPException(status_code=404, detail="Book not found")
-            return result
+        await books_cache.set(str(book_id), result.model_dump(mode='json'))
+        return result
+
+
+    @staticmethod
+    async def get_books_batch(book_ids: List[int], uow: UnitOfWork) -> List[Book]:
+        async with uow.begin():
+            return await BooksRepository.get_many(uow.get_connection(), book_ids)
 
 
     @staticmethod
@@ -3,7 +3,7 @@ from fastapi import HTTPException
 
 from app.repositories import GenresRepository
 from app.schemas import Genre, GenreCreate
-from app.utils import CrudException, UnitOfWork
+from app.utils import CrudException, UnitOfWork, genres_cache
 
 
 __all__ = ["GenreService"]
@@ -11,28 +11,37 @@ __all__ = ["GenreService"]
 
 class GenreService:
     @staticmethod
-    async def get_genres(name: Optional[str], uow: UnitOfWork) -> List[Genre]:
+    async def get_genres(name: Optional[str], ranked: bool, uow: UnitOfWork) -> List[Genre]:
+        key = f"list:{ranked}:{name!r}"
+        cached = await genres_cache.get(key)
+        if cached is not None:
+            return [Genre.model_validate(genre) for genre in cached]
         async with uow.begin():
-            genres = await GenresRepository.get_multiple(uow.get_connection(), name)
+            genres = await GenresRepository.get_multiple(uow.get_connection(), name, ranked)
             if genres is None:
                 raise HTTPException(status_code=404, detail="Genre not found")
-            return genres
+        genres = [Genre.model_validate(dict(genre)) for genre in genres]
+        await genres_cache.set(key, [genre.model_dump(mode='json') for genre in genres])
+        return genres
 
     @staticmethod
     async def get_genre(genre_id: int, uow: UnitOfWork) -> Genre:
+        cached = await genres_cache.get(str(genre_id))
+        if cached is not None:
+            return Genre.model_validate(cached)
         async with uow.begin():
             genre = await GenresRepository.get(uow.get_connection(), genre_id)
             if genre is None:
                 raise HTTPException(status_code=404, detail="Genre not found")
-            return genre
+        genre = Genre.model_validate(dict(genre))
+        await genres_cache.set(str(genre_id), genre.model_dump(mode='json'))
+        return genre
 
     @staticmethod
     async def create_genre(genre: GenreCreate, uow: UnitOfWork) -> int:
         async with uow.begin():
-            key = await GenresRepository.get_multiple(uow.get_connection(), name=genre.name)
-            if len(key) == 0:
-                key = await GenresRepository.create(uow.get_connection(), genre)
-            else:
+            key = await GenresRepository.create(uow.get_connection(), genre)
+            if key is None:
                 raise HTTPException(status_code=409, detail="Genre already exists")
             return key
 
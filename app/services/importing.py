@@ -0,0 +1,116 @@
+import asyncio, csv, json, os, time, urllib.parse
+from typing import List
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.repositories import BooksRepository, Indexing, Storage
+from app.schemas import BookCreate, BookManifestRow, BooksImport, BooksImportReport
+from app.utils import UnitOfWork
+
+
+__all__ = ["ImportService"]
+
+
+class ImportService:
+    @staticmethod
+    def _read_manifest(path: str) -> List[BookManifestRow]:
+        with open(path, newline='', encoding='utf-8') as file:
+            if path.endswith('.csv'):
+                raw_rows = list(csv.DictReader(file))
+            else:
+                raw_rows = [json.loads(line) for line in file if line.strip()]
+        rows = []
+        for number, raw_row in enumerate(raw_rows, 1):
+            try:
+                rows.append(BookManifestRow.model_validate(
+                    {key: value for key, value in raw_row.items() if value not in ('', None)}
+                ))
+            except ValidationError as e:
+                raise ValueError(f"Manifest row {number} is invalid: {e}")
+        return rows
+
+    @staticmethod
+    def _read_checkpoint(path: str) -> int:
+        if not os.path.exists(path):
+            return 0
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)['rows_done']
+
+    @staticmethod
+    def _write_checkpoint(path: str, rows_done: int) -> None:
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as file:
+            json.dump({'rows_done': rows_done}, file)
+        os.replace(f"{path}.tmp", path)
+
+    @staticmethod
+    async def import_books(books_import: BooksImport, uow: UnitOfWork) -> BooksImportReport:
+        try:
+            return await ImportService._import_books(books_import, uow)
+        except (ValueError, OSError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @staticmethod
+    async def _import_books(books_import: BooksImport, uow: UnitOfWork) -> BooksImportReport:
+        """
+        Imports manifest rows in batches: files of a batch are uploaded concurrently, books are inserted
+        in one transaction and sent to bulk indexing. Committed rows are recorded in `<manifest>.checkpoint`,
+        so an interrupted import resumes from the first uncommitted batch.
+        """
+        rows = ImportService._read_manifest(books_import.manifest_path)
+        checkpoint_path = f"{books_import.manifest_path}.checkpoint"
+        skipped = ImportService._read_checkpoint(checkpoint_path)
+        semaphore = asyncio.Semaphore(books_import.concurrency)
+
+        async def upload(local_path: str) -> str:
+            async with semaphore:
+                return urllib.parse.quote(await Storage.upload_local_file(local_path))
+
+        started = time.monotonic()
+        uploaded_bytes = 0
+        indexing = []
+        for start in range(skipped, len(rows), books_import.batch_size):
+            batch = rows[start:start + books_import.batch_size]
+            local_paths = []
+            for row in batch:
+                for file in (row.pdf_file, row.image_file):
+                    if file is None:
+                        continue
+                    local_path = os.path.join(books_import.files_dir, file)
+                    if not os.path.isfile(local_path):
+                        raise ValueError(f"File {file} is not found")
+                    local_paths.append(local_path)
+
+            qnames = iter(await asyncio.gather(*[upload(local_path) for local_path in local_paths]))
+            uploaded_bytes += sum(os.path.getsize(path) for path in local_paths)
+
+            books = []
+            for row in batch:
+                pdf_qname = next(qnames)
+                image_qname = next(qnames) if row.image_file is not None else None
+                books.append(BookCreate(
+                    **row.model_dump(exclude={'pdf_file', 'image_file'}), pdf_qname=pdf_qname, image_qname=image_qname
+                ))
+
+            async with uow.begin():
+                book_ids = await BooksRepository.create_many(uow.get_connection(), books)
+            ImportService._write_checkpoint(checkpoint_path, start + len(batch))
+
+            indexing.append(asyncio.create_task(Indexing.index_books_bulk([
+                (book_id, row.genre, os.path.join(books_import.files_dir, row.pdf_file))
+                for book_id, row in zip(book_ids, batch)
+            ])))
+
+            elapsed = time.monotonic() - started
+            print(
+                f"BOOK-IMPORT: {start + len(batch)}/{len(rows)} rows, "
+                f"{(start + len(batch) - skipped) / elapsed:.1f} books/s, {uploaded_bytes / elapsed / 2 ** 20:.1f} MB/s"
+            )
+
+        await asyncio.gather(*indexing)
+        elapsed = time.monotonic() - started
+        imported = len(rows) - skipped
+        return BooksImportReport(
+            imported=imported, skipped=skipped, seconds=elapsed,
+            books_per_second=imported / elapsed if elapsed else 0.0,
+            megabytes_per_second=uploaded_bytes / elapsed / 2 ** 20 if elapsed else 0.0
+        )
@@ -0,0 +1,30 @@
+from app.schemas import CacheStats, LimiterStats
+from app.utils import Cache
+from app.utils.limits import RateLimiter, ConcurrencyLimiter
+
+
+__all__ = ["MetricsService"]
+
+
+class MetricsService:
+    @staticmethod
+    def get_cache_stats() -> dict[str, CacheStats]:
+        return {
+            namespace: CacheStats(
+                hits=cache.hits, misses=cache.misses,
+                hit_ratio=cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else 0.0
+            )
+            for namespace, cache in Cache.instances.items()
+        }
+
+    @staticmethod
+    def get_limits_stats() -> dict[str, LimiterStats]:
+        stats = {
+            f"rate:{name}": LimiterStats(allowed=limiter.allowed, rejected=limiter.rejected)
+            for name, limiter in RateLimiter.instances.items()
+        }
+        for name, limiter in ConcurrencyLimiter.instances.items():
+            stats[f"concurrency:{name}"] = LimiterStats(
+                allowed=limiter.allowed, rejected=limiter.rejected, in_flight=limiter.in_flight
+            )
+        return stats
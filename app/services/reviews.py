@@ -1,8 +1,14 @@
-from typing import List
+import asyncio
+import time
+from typing import List, Optional
 from fastapi import HTTPException
 
 from app.repositories import ReviewsRepository
-from app.schemas import User, ReviewsFiltersScheme, Review, ReviewCreate, ReviewUpdate
+from app.settings import reviews_cred
+from app.schemas import (
+    User, ReviewsFiltersScheme, Review, ReviewCreate, ReviewUpdate, BookRating, ReviewDetailed, ReviewsSortEnum, Page,
+    SortOrderEnum, RatingsReconciliation, RatingsReconciliationReport
+)
 from app.utils import UnitOfWork
 
 
@@ -18,6 +24,24 @@ class ReviewService:
             except ValueError as e:
                 raise HTTPException(status_code=400, detail=str(e))
 
+    @staticmethod
+    async def get_reviews_page(
+            book_id: Optional[int],
+            owner_id: Optional[int],
+            sort_by: ReviewsSortEnum,
+            order: SortOrderEnum,
+            limit: int,
+            cursor: Optional[str],
+            uow: UnitOfWork
+    ) -> Page[ReviewDetailed]:
+        async with uow.begin():
+            try:
+                return await ReviewsRepository.get_page(
+                    uow.get_connection(), book_id, owner_id, sort_by, order, limit, cursor
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
     @staticmethod
     async def get_review(review_id: int, uow: UnitOfWork) -> Review:
         async with uow.begin():
@@ -42,6 +66,21 @@ class ReviewService:
                 raise HTTPException(status_code=404, detail="Book not found")
             return reviews_count
 
+    @staticmethod
+    async def get_rating(book_id: int, uow: UnitOfWork) -> BookRating:
+        async with uow.begin():
+            rating = await ReviewsRepository.get_rating(uow.get_connection(), book_id)
+            if rating is None:
+                raise HTTPException(status_code=404, detail="Book not found")
+            return rating
+
+    @staticmethod
+    async def get_ratings(book_ids: List[int], user_creds: Optional[User], uow: UnitOfWork) -> List[BookRating]:
+        async with uow.begin():
+            return await ReviewsRepository.get_ratings(
+                uow.get_connection(), book_ids, user_creds.id if user_creds else None
+            )
+
     @staticmethod
     async def create_review(review: ReviewCreate, user_creds: User, uow: UnitOfWork) -> Review:
         async with uow.begin():
@@ -67,3 +106,50 @@ class ReviewService:
                 return await ReviewsRepository.delete(uow.get_connection(), review_id, user_creds.id)
             except ValueError as e:
                 raise HTTPException(status_code=400, detail=str(e))
+
+    @staticmethod
+    async def flush_pending_ratings(uow: UnitOfWork) -> int:
+        """Folds all pending rating shards into books batch by batch, returns the number of book updates"""
+        flushed = 0
+        while True:
+            async with uow.begin():
+                updated = await ReviewsRepository.flush_rating_shards(
+                    uow.get_connection(), reviews_cred.rating_flush_batch
+                )
+            if updated == 0:
+                return flushed
+            flushed += updated
+
+    @staticmethod
+    async def run_rating_flusher(uow: UnitOfWork) -> None:
+        while True:
+            await asyncio.sleep(reviews_cred.rating_flush_interval)
+            try:
+                await ReviewService.flush_pending_ratings(uow)
+            except Exception as e:
+                print(f"BOOK-PROCESSING: rating flush failed: {e}")
+
+    @staticmethod
+    async def reconcile_ratings(
+            reconciliation: RatingsReconciliation, uow: UnitOfWork
+    ) -> RatingsReconciliationReport:
+        """Recomputes books ratings batch by batch, each batch in its own short transaction"""
+        started = time.perf_counter()
+        checked = 0
+        drifts = []
+        last_id = 0
+        while True:
+            async with uow.begin():
+                connection = uow.get_connection()
+                book_ids = await ReviewsRepository.get_book_ids_batch(
+                    connection, last_id, reconciliation.batch_size, reconciliation.book_ids
+                )
+                if not book_ids:
+                    break
+                drifts.extend(await ReviewsRepository.reconcile_ratings(connection, book_ids))
+            checked += len(book_ids)
+            last_id = book_ids[-1]
+            print(f"BOOK-PROCESSING: ratings of {checked} books reconciled, {len(drifts)} drifted")
+        return RatingsReconciliationReport(
+            checked=checked, drifted=len(drifts), seconds=time.perf_counter() - started, drifts=drifts
+        )
@@ -1,9 +1,20 @@
+import mimetypes
+import secrets
+import time
 import urllib.parse
-from fastapi import UploadFile, HTTPException
-from fastapi.responses import StreamingResponse, Response
+from email.utils import format_datetime
+from typing import AsyncGenerator, List
+from fastapi import UploadFile, HTTPException, Request
+from starlette.requests import ClientDisconnect
+from fastapi.responses import StreamingResponse, Response, RedirectResponse
 
-from app.schemas import FileUploadedScheme, User, PrivilegesEnum
-from app.repositories import Storage
+from app.schemas import (
+    FileUploadedScheme, User, PrivilegesEnum, PresignedUploadRequest, PresignedUpload, FileUploadCompletion, BookUpdate,
+    FileStreamUploaded
+)
+from app.repositories import Storage, BooksRepository
+from app.settings import minio_cred
+from app.utils import FILE_CACHE_CONTROL, etag_matches, parse_range, if_range_matches, UnitOfWork
 
 
 __all__ = ["StorageService"]
@@ -11,30 +22,183 @@ __all__ = ["StorageService"]
 
 class StorageService:
     @staticmethod
-    def upload_file(file: UploadFile) -> FileUploadedScheme:
-        book_object = Storage.upload_file_to_s3(file)
-        return FileUploadedScheme(qname=urllib.parse.quote(book_object.object_name))
+    async def upload_file(file: UploadFile) -> FileUploadedScheme:
+        object_path = await Storage.upload_file_to_s3(file)
+        return FileUploadedScheme(qname=urllib.parse.quote(object_path))
 
     @staticmethod
-    def download_file(filename: str) -> StreamingResponse:
-        if not Storage.is_file_exists(filename):
+    def __max_upload_size(content_type: str) -> int:
+        if content_type == "application/pdf":
+            return minio_cred.max_pdf_size
+        if content_type.startswith("image/"):
+            return minio_cred.max_image_size
+        return minio_cred.max_other_size
+
+    @staticmethod
+    async def upload_file_stream(filename: str, request: Request) -> FileStreamUploaded:
+        """
+        Streams the raw request body into storage, never holding more than a multipart part of it.
+        Verifies the body against the X-Checksum-SHA256 header when the client sends one.
+        A file identical to a stored one isn't stored again, the stored one's qname is returned
+        """
+        content_type = mimetypes.guess_type(filename)[0] or request.headers.get("content-type") or \
+            "application/octet-stream"
+        max_size = StorageService.__max_upload_size(content_type)
+        content_length = request.headers.get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_size:
+            raise HTTPException(413, f"File is larger than {max_size} bytes")
+
+        started = time.perf_counter()
+        try:
+            temporary_path, size, sha256 = await Storage.upload_stream(request.stream(), max_size, content_type)
+        except ValueError as e:
+            raise HTTPException(413, str(e))
+        except ClientDisconnect:
+            print(f"BOOK-PROCESSING: upload of {filename} aborted, client disconnected")
+            raise HTTPException(400, "Upload interrupted")
+
+        expected_sha256 = request.headers.get("x-checksum-sha256")
+        if expected_sha256 is not None and expected_sha256.strip().lower() != sha256:
+            await Storage.delete_file_in_s3(temporary_path)
+            raise HTTPException(422, "Checksum mismatch")
+        object_path = await Storage.store_upload(temporary_path, sha256, filename)
+        seconds = time.perf_counter() - started
+
+        megabytes_per_second = size / 2 ** 20 / seconds if seconds else 0.0
+        print(f"BOOK-PROCESSING: {object_path} uploaded, {size} bytes in {seconds:.1f} s "
+              f"({megabytes_per_second:.1f} MB/s)")
+        return FileStreamUploaded(
+            qname=urllib.parse.quote(object_path), size=size, sha256=sha256,
+            seconds=seconds, megabytes_per_second=megabytes_per_second
+        )
+
+    @staticmethod
+    async def create_presigned_upload(upload: PresignedUploadRequest) -> PresignedUpload:
+        """URL to PUT the file to its content address, none when an identical file is already stored"""
+        StorageService.__check_presigned_mode()
+        object_path = Storage.content_key(upload.sha256.lower(), upload.filename)
+        if await Storage.is_file_exists(object_path):
+            return PresignedUpload(qname=urllib.parse.quote(object_path))
+        return PresignedUpload(
+            qname=urllib.parse.quote(object_path),
+            url=Storage.presigned_upload_url(object_path),
+            expires_in=minio_cred.presigned_ttl
+        )
+
+    @staticmethod
+    async def complete_upload(completion: FileUploadCompletion, uow: UnitOfWork) -> FileUploadedScheme:
+        """Checks the presigned upload has landed and attaches it to the book, which indexes the PDF"""
+        StorageService.__check_presigned_mode()
+        if not await Storage.is_file_exists(urllib.parse.unquote(completion.qname)):
+            raise HTTPException(404, "File was not uploaded")
+        if completion.book_id is not None:
+            async with uow.begin():
+                book = await BooksRepository.update(
+                    uow.get_connection(), completion.book_id, BookUpdate(pdf_qname=completion.qname)
+                )
+                if book is None:
+                    raise HTTPException(status_code=404, detail="Book not found")
+        return FileUploadedScheme(qname=completion.qname)
+
+    @staticmethod
+    def __check_presigned_mode() -> None:
+        if minio_cred.transfer_mode != "presigned":
+            raise HTTPException(404, "Presigned uploads are disabled")
+
+    @staticmethod
+    async def download_file(filename: str, request: Request) -> Response:
+        """
+        Whole file, or its byte ranges (206) when the request has an applicable Range header.
+        In presigned mode a redirect to MinIO, which serves ranges itself
+        """
+        file_info = await Storage.get_file_info(filename)
+        if file_info is None:
             raise HTTPException(404, "File not found")
+        original_name = Storage.original_name(file_info)
+        if minio_cred.transfer_mode == "presigned":
+            return RedirectResponse(
+                Storage.presigned_download_url(filename, original_name),
+                status_code=307, headers={"Cache-Control": "no-store"}
+            )
+        content_type = file_info.content_type
+        if not content_type or content_type == "application/octet-stream":
+            content_type = mimetypes.guess_type(original_name)[0] or "application/octet-stream"
+        headers = {
+            "ETag": f'"{file_info.etag}"',
+            "Cache-Control": FILE_CACHE_CONTROL,
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": f"attachment; filename={urllib.parse.quote(original_name)}"
+        }
+        if file_info.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(file_info.last_modified, usegmt=True)
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        ranges = None
+        if if_range_matches(request, headers["ETag"], file_info.last_modified):
+            try:
+                ranges = parse_range(request.headers.get("range"), file_info.size)
+            except ValueError:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{file_info.size}"})
+
+        if ranges is None:
+            return StreamingResponse(
+                Storage.file_stream_generator(filename),
+                media_type=content_type,
+                headers={**headers, "Content-Length": str(file_info.size)}
+            )
+        if len(ranges) == 1:
+            first, last = ranges[0]
+            return StreamingResponse(
+                Storage.file_stream_generator(filename, first, last - first + 1),
+                status_code=206,
+                media_type=content_type,
+                headers={
+                    **headers,
+                    "Content-Length": str(last - first + 1),
+                    "Content-Range": f"bytes {first}-{last}/{file_info.size}"
+                }
+            )
+
+        boundary = secrets.token_hex(16)
+        parts_headers = [
+            f"--{boundary}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Range: bytes {first}-{last}/{file_info.size}\r\n\r\n".encode()
+            for first, last in ranges
+        ]
+        closing = f"\r\n--{boundary}--\r\n".encode()
+        # every part but the first is preceded by CRLF, which ends the previous part's data
+        content_length = (
+            sum(len(part) for part in parts_headers) + 2 * (len(ranges) - 1)
+            + sum(last - first + 1 for first, last in ranges) + len(closing)
+        )
         return StreamingResponse(
-            Storage.file_stream_generator(f"{filename}"),
-            media_type="application/octet-stream",
-            headers={"Content-Disposition": f"attachment; filename={urllib.parse.quote(filename)}"}
+            StorageService.__ranges_stream_generator(filename, ranges, parts_headers, closing),
+            status_code=206,
+            media_type=f"multipart/byteranges; boundary={boundary}",
+            headers={**headers, "Content-Length": str(content_length)}
         )
 
     @staticmethod
-    def list_files() -> list[FileUploadedScheme]:
+    async def __ranges_stream_generator(
+            filename: str, ranges: List[tuple[int, int]], parts_headers: List[bytes], closing: bytes
+    ) -> AsyncGenerator[bytes, None]:
+        for index, ((first, last), part_headers) in enumerate(zip(ranges, parts_headers)):
+            yield part_headers if index == 0 else b"\r\n" + part_headers
+            async for chunk in Storage.file_stream_generator(filename, first, last - first + 1):
+                yield chunk
+        yield closing
+
+    @staticmethod
+    async def list_files() -> list[FileUploadedScheme]:
         return [
             FileUploadedScheme(qname=urllib.parse.quote(obj.object_name))
-            for obj in Storage.list_files_in_s3()
+            for obj in await Storage.list_files_in_s3()
         ]
 
     @staticmethod
-    def delete_file(filename: str) -> Response:
-        if not Storage.is_file_exists(filename):
+    async def delete_file(filename: str) -> Response:
+        if not await Storage.is_file_exists(filename):
             raise HTTPException(404, "File not found")
-        Storage.delete_file_in_s3(filename)
+        await Storage.delete_file_in_s3(filename)
         return Response(status_code=200)
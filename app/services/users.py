@@ -1,7 +1,8 @@
+from typing import Optional
 from fastapi import HTTPException, status, Response
 
 from app.repositories import UsersRepository
-from app.schemas import PrivilegesEnum, UserRegister, UserLogin, User, UserLogined, UserUpdate
+from app.schemas import PrivilegesEnum, UserRegister, UserLogin, User, UserLogined, UserUpdate, Page
 from app.utils import UnitOfWork
 from app.utils.auth import create_access_token
 
@@ -67,7 +68,9 @@ class UserService:
             return user
 
     @staticmethod
-    async def get_users(uow: UnitOfWork) -> list[User]:
+    async def get_users(search: Optional[str], limit: int, cursor: Optional[str], uow: UnitOfWork) -> Page[User]:
         async with uow.begin():
-            data = await UsersRepository.get_multiple(uow.get_connection())
-            return data
+            try:
+                return await UsersRepository.get_multiple(uow.get_connection(), search, limit, cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
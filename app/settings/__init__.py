@@ -1,4 +1,7 @@
 from .auth import *
+from .cache import *
 from .database import *
 from .elastic import *
+from .limits import *
+from .reviews import *
 from .storage import *
\ No newline at end of file
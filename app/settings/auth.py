@@ -1,3 +1,5 @@
+from typing import Literal
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,6 +10,14 @@ class AuthSettings(BaseSettings):
     model_config = SettingsConfigDict(env_file="./config/auth.env")
     secret_key: str
     algorithm: str
+    # seconds an authenticated user is served from cache instead of the database
+    principal_cache_ttl: float = 30.0
+    # hashing scheme of new passwords and its costs, stored hashes made otherwise are upgraded on login
+    password_scheme: Literal["bcrypt", "argon2"] = "bcrypt"
+    bcrypt_rounds: int = Field(12, ge=4, le=31)
+    argon2_time_cost: int = Field(3, ge=1)
+    argon2_memory_cost: int = Field(65536, ge=8, description="KiB")
+    hashing_workers: int = Field(2, gt=0, description="Threads hashing passwords at once per worker")
 
 
 auth_cred = AuthSettings()
@@ -0,0 +1,16 @@
+from typing import Literal, Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+__all__ = ["cache_cred"]
+
+
+class CacheSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='CACHE_', env_file="./config/cache.env")
+    backend: Literal["memory", "redis"] = "memory"
+    max_entries: int = 10000
+    ttl: float = 60
+    redis_url: Optional[str] = None
+
+
+cache_cred = CacheSettings()
@@ -0,0 +1,27 @@
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+__all__ = ["limits_cred"]
+
+
+class LimitsSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='LIMITS_', env_file="./config/limits.env")
+    enabled: bool = True
+    # clients tracked per limiter, the least recently seen ones are forgotten (their buckets refill)
+    max_clients: int = Field(100000, gt=0)
+    # rates are requests per second per client, bursts are bucket sizes, in_flight caps are per worker
+    auth_rate: float = Field(0.5, gt=0.0)
+    auth_burst: int = Field(10, gt=0)
+    book_create_rate: float = Field(0.5, gt=0.0)
+    book_create_burst: int = Field(5, gt=0)
+    book_create_in_flight: int = Field(4, gt=0)
+    upload_rate: float = Field(1.0, gt=0.0)
+    upload_burst: int = Field(5, gt=0)
+    upload_in_flight: int = Field(8, gt=0)
+    semantic_search_rate: float = Field(2.0, gt=0.0)
+    semantic_search_burst: int = Field(10, gt=0)
+    semantic_search_in_flight: int = Field(16, gt=0)
+
+
+limits_cred = LimitsSettings()
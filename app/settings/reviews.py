@@ -0,0 +1,18 @@
+from typing import Literal
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+__all__ = ["reviews_cred"]
+
+
+class ReviewsSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='REVIEWS_', env_file="./config/reviews.env")
+    # deferred: marks go to sharded counter rows which are periodically folded into book_table
+    rating_mode: Literal["immediate", "deferred"] = "immediate"
+    rating_shards: int = Field(16, gt=0)
+    rating_flush_interval: float = Field(5.0, gt=0.0)
+    rating_flush_batch: int = Field(1000, gt=0)
+
+
+reviews_cred = ReviewsSettings()
@@ -1,8 +1,10 @@
+from typing import Literal, Optional
 from minio import Minio
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
-__all__ = ["minio_client", "minio_cred"]
+__all__ = ["minio_client", "minio_presign_client", "minio_cred"]
 
 
 class MinioSettings(BaseSettings):
@@ -13,6 +15,24 @@ class MinioSettings(BaseSettings):
     port: int
     login: str
     password: str
+    # threads running blocking MinIO calls per worker, minio's connection pool keeps 10 connections
+    io_workers: int = 10
+    stream_chunk_size: int = 64 * 1024
+    # streaming uploads: parts of multipart uploads (5 MiB at least) and uploads in progress per worker
+    upload_part_size: int = Field(16 * 1024 * 1024, ge=5 * 1024 * 1024)
+    upload_workers: int = Field(4, gt=0)
+    # upload size limits by kind of file
+    max_pdf_size: int = 4 * 1024 ** 3
+    max_image_size: int = 50 * 1024 ** 2
+    max_other_size: int = 100 * 1024 ** 2
+    # presigned: file bytes go between clients and MinIO directly, the API only hands out short-lived URLs
+    transfer_mode: Literal["proxy", "presigned"] = "proxy"
+    presigned_ttl: int = 300
+    # MinIO address as seen by clients, when it differs from the one the backend uses
+    public_hostname: Optional[str] = None
+    public_port: Optional[int] = None
+    public_secure: bool = False
+    region: str = "us-east-1"
 
     @property
     def minio_url(self) -> str:
@@ -28,3 +48,13 @@ minio_client = Minio(
     secret_key=minio_cred.password,
     secure=False
 )
+
+# URLs are signed for the host clients connect to, the region is fixed so signing needs no requests to MinIO
+minio_presign_client = Minio(
+    f"{minio_cred.public_hostname}:{minio_cred.public_port or minio_cred.port}"
+    if minio_cred.public_hostname else minio_cred.minio_url,
+    access_key=minio_cred.login,
+    secret_key=minio_cred.password,
+    secure=minio_cred.public_secure if minio_cred.public_hostname else False,
+    region=minio_cred.region
+)
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.hashing_benchmark import probe_latencies
+from app.repositories import Storage
+
+
+async def _read(object_name: str) -> int:
+    size = 0
+    async for chunk in Storage.file_stream_generator(object_name):
+        size += len(chunk)
+    return size
+
+
+async def run(object_name: str, readers: int) -> None:
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_latencies(stop, 0.001))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    sizes = await asyncio.gather(*(_read(object_name) for _ in range(readers)))
+    seconds = time.perf_counter() - started
+    stop.set()
+    latencies = sorted(await probe)
+
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if len(latencies) >= 100 else max(latencies, default=0.0)
+    print(f"{readers} readers: {sum(sizes) / seconds / 2 ** 20:.1f} MB/s, "
+          f"event loop lag p50 {statistics.median(latencies or [0.0]) * 1000:.1f} ms, "
+          f"p99 {p99 * 1000:.1f} ms, max {max(latencies, default=0.0) * 1000:.1f} ms")
+
+
+## shell: python -m app.storage_benchmark book.pdf --readers 1 10 100
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Download throughput and event loop lag with many concurrent readers of one object"
+    )
+    parser.add_argument("object_name")
+    parser.add_argument("--readers", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+    for readers in args.readers:
+        asyncio.run(run(args.object_name, readers))
@@ -1,5 +1,9 @@
+from .cache import *
 from .crypt import *
 from .database import *
+from .filters import *
+from .http import *
+from .pagination import *
 from .unit_of_work import *
 
 
@@ -1,3 +1,5 @@
+import hashlib
+from typing import Optional
 from jose import jwt, JWTError
 from datetime import datetime, timedelta, timezone
 from fastapi import Request, HTTPException, status, Depends
@@ -5,9 +7,10 @@ from fastapi import Request, HTTPException, status, Depends
 from app.repositories.users import UsersRepository
 from app.schemas import User, PrivilegesEnum
 from app.settings import auth_cred, async_session_maker
+from app.utils import principals_cache
 
 
-__all__ = ["create_access_token", "get_current_user", "user_has_permissions"]
+__all__ = ["create_access_token", "get_current_user", "get_optional_user", "user_has_permissions"]
 
 _priority_ = {
     "basic": 1,
@@ -31,7 +34,7 @@ def get_token(request: Request):
     return token
 
 
-async def get_current_user(token: str = Depends(get_token)):
+async def get_current_user(token: str = Depends(get_token)) -> User:
     try:
         payload = jwt.decode(token, auth_cred.secret_key, algorithms=[auth_cred.algorithm])
     except JWTError:
@@ -45,11 +48,28 @@ async def get_current_user(token: str = Depends(get_token)):
     user_id = payload.get('sub')
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='User author_id wasn\'t found')
-    async with async_session_maker() as session:
-        user = await UsersRepository.get(session, int(user_id))
-        if not user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='User not found')
-    return user
+
+    cache_key = f"{int(user_id)}:{hashlib.sha256(token.encode()).hexdigest()}"
+    user = await principals_cache.get(cache_key)
+    if user is None:
+        async with async_session_maker() as session:
+            user = await UsersRepository.get(session, int(user_id))
+            if not user:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='User not found')
+        user = dict(user)
+        await principals_cache.set(cache_key, user)
+    return User(**user)
+
+
+async def get_optional_user(request: Request) -> Optional[User]:
+    """Current user for endpoints open to anonymous clients: None without a valid token"""
+    token = request.cookies.get('users_access_token')
+    if not token:
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        return None
 
 
 def user_has_permissions(permission: PrivilegesEnum):
@@ -0,0 +1,136 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.settings import cache_cred, auth_cred
+
+
+__all__ = [
+    "Cache", "MemoryBackend", "RedisBackend", "books_cache", "authors_cache", "genres_cache", "facets_cache",
+    "author_ids_cache", "genre_ids_cache", "principals_cache"
+]
+
+
+class MemoryBackend:
+    """Bounded in-process LRU storage, entries expire `ttl` seconds after being set"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.__entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.__entries[key]
+            return None
+        self.__entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self.__entries[key] = (time.monotonic() + ttl, value)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.__entries.pop(key, None)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        for key in [key for key in self.__entries if key.startswith(prefix)]:
+            del self.__entries[key]
+
+
+class RedisBackend:
+    """Storage shared between workers in Redis or any server speaking its protocol, values are kept as JSON"""
+
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError("Redis cache backend requires the 'redis' package")
+        self.__client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.__client.get(key)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.__client.set(key, json.dumps(value), px=int(ttl * 1000))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.__client.delete(*keys)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        keys = [key async for key in self.__client.scan_iter(match=f"{prefix}*")]
+        if keys:
+            await self.__client.delete(*keys)
+
+
+def _default_backend() -> MemoryBackend | RedisBackend:
+    if cache_cred.backend == "redis":
+        if cache_cred.redis_url is None:
+            raise RuntimeError("CACHE_REDIS_URL must be set for redis cache backend")
+        return RedisBackend(cache_cred.redis_url)
+    return MemoryBackend(cache_cred.max_entries)
+
+
+class Cache:
+    """Namespaced cache with hit/miss counters. Values must be JSON-compatible to work with any backend"""
+    instances: dict[str, "Cache"] = {}
+    __default_backend: MemoryBackend | RedisBackend | None = None
+
+    def __init__(self, namespace: str, ttl: float = cache_cred.ttl, backend: MemoryBackend | RedisBackend = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.__backend = backend
+        self.hits = 0
+        self.misses = 0
+        Cache.instances[namespace] = self
+
+    @property
+    def backend(self) -> MemoryBackend | RedisBackend:
+        if self.__backend is None:
+            if Cache.__default_backend is None:
+                Cache.__default_backend = _default_backend()
+            self.__backend = Cache.__default_backend
+        return self.__backend
+
+    def __key(self, key: str) -> str:
+        return f"library:{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.backend.get(self.__key(key))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        await self.backend.set(self.__key(key), value, self.ttl)
+
+    async def delete(self, *keys: str) -> None:
+        await self.backend.delete(*[self.__key(key) for key in keys])
+
+    async def delete_prefix(self, prefix: str) -> None:
+        await self.backend.delete_prefix(self.__key(prefix))
+
+    async def clear(self) -> None:
+        await self.delete_prefix("")
+
+
+books_cache = Cache("books")
+authors_cache = Cache("authors")
+genres_cache = Cache("genres")
+facets_cache = Cache("facets", ttl=30)
+# names to ids of existing rows, kept in-process since they are read on every book creation
+author_ids_cache = Cache("author_ids", backend=MemoryBackend(4096))
+genre_ids_cache = Cache("genre_ids", backend=MemoryBackend(4096))
+# authenticated users by "<user_id>:<token digest>", short-lived so privilege changes made by other workers apply soon
+principals_cache = Cache("principals", ttl=auth_cred.principal_cache_ttl)
@@ -1,14 +1,42 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from passlib.context import CryptContext
 
-__all__ = ["get_password_hash", "verify_password"]
+from app.settings import auth_cred
 
+__all__ = ["get_password_hash", "verify_password", "verify_and_update_password", "shutdown_hashing"]
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# the preferred scheme hashes new passwords, hashes of the other one (or with other costs) are rehashed on login
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"] if auth_cred.password_scheme == "argon2" else ["bcrypt", "argon2"],
+    deprecated="auto",
+    bcrypt__rounds=auth_cred.bcrypt_rounds,
+    argon2__time_cost=auth_cred.argon2_time_cost,
+    argon2__memory_cost=auth_cred.argon2_memory_cost
+)
+# bcrypt and argon2 release the GIL, so a few threads keep hashing off the event loop
+# and bound the CPU spent on it, excess logins wait in the executor queue
+_hashing_executor = ThreadPoolExecutor(max_workers=auth_cred.hashing_workers, thread_name_prefix="hashing")
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
 
+async def _run_hashing(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(_hashing_executor, function, *args)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+
+async def get_password_hash(password: str) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hashing(pwd_context.verify, plain_password, hashed_password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Whether the password matches and its new hash if the stored one uses outdated scheme or costs"""
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+def shutdown_hashing() -> None:
+    _hashing_executor.shutdown(wait=False, cancel_futures=True)
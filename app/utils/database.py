@@ -1,3 +1,5 @@
+from sqlalchemy import text
+
 from app.settings import db_engine
 from app.models import db_metadata
 
@@ -5,9 +7,19 @@ from app.models import db_metadata
 __all__ = ["create_tables", "close_connections", "delete_tables"]
 
 
+def _create_schema(connection) -> None:
+    # trigram indexes of substring filters
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    db_metadata.create_all(connection)
+    # create_all skips the indexes of already existing tables
+    for table in db_metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
 async def create_tables() -> None:
     async with db_engine.begin() as connection:
-        await connection.run_sync(db_metadata.create_all)
+        await connection.run_sync(_create_schema)
 
 
 async def close_connections():
@@ -0,0 +1,33 @@
+from sqlalchemy import ColumnElement, func
+
+
+__all__ = ["contains", "starts_with", "similarity", "normalized", "normalize_name"]
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def contains(column: ColumnElement, value: str) -> ColumnElement:
+    """Case-insensitive substring match, served by the column's pg_trgm GIN index"""
+    return column.ilike(f"%{_escape_like(value)}%", escape='\\')
+
+
+def starts_with(column: ColumnElement, value: str) -> ColumnElement:
+    """Case-insensitive prefix match, served by a text_pattern_ops index on lower(column)"""
+    return func.lower(column).like(f"{_escape_like(value.lower())}%", escape='\\')
+
+
+def similarity(column: ColumnElement, value: str) -> ColumnElement:
+    """Trigram similarity of `value` to the closest part of `column`, from 0 to 1"""
+    return func.word_similarity(value, column)
+
+
+def normalized(column: ColumnElement) -> ColumnElement:
+    """Name as compared by the unique normalized-name indexes"""
+    return func.lower(func.btrim(column))
+
+
+def normalize_name(name: str) -> str:
+    """Python counterpart of `normalized`"""
+    return name.strip().lower()
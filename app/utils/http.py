@@ -0,0 +1,99 @@
+import hashlib
+import json
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, List, Optional
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+__all__ = [
+    "METADATA_CACHE_CONTROL", "FILE_CACHE_CONTROL", "make_etag", "etag_matches", "conditional_response",
+    "parse_range", "if_range_matches"
+]
+
+
+# metadata may change at any moment, so clients have to revalidate it on each use
+METADATA_CACHE_CONTROL = "no-cache"
+FILE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# more ranges in one request are served as the whole file, so a client can't make us send a file many times over
+MAX_RANGES = 16
+
+
+def make_etag(data: Any) -> str:
+    body = json.dumps(jsonable_encoder(data), sort_keys=True, separators=(',', ':'))
+    return f'"{hashlib.sha256(body.encode()).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+def conditional_response(
+        request: Request, response: Response, data: Any, cache_control: str = METADATA_CACHE_CONTROL
+) -> Any:
+    """Returns 304 when the client already has `data`, otherwise `data` with validators set on `response`"""
+    headers = {"ETag": make_etag(data), "Cache-Control": cache_control}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return data
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[List[tuple[int, int]]]:
+    """
+    Byte ranges of a Range header as (first, last) inclusive offsets clipped to `size`.
+    None when the header is absent, malformed or asks too much, so the whole file is served;
+    ValueError when none of the ranges is satisfiable
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+    specs = specs.split(",")
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, separator, last = spec.strip().partition("-")
+        if not separator or not (first.isdigit() or last.isdigit()):
+            return None
+        if not first:
+            # suffix range: the last `last` bytes
+            length = int(last)
+            if length > 0 and size > 0:
+                ranges.append((max(size - length, 0), size - 1))
+            continue
+        if not first.isdigit() or last and not last.isdigit():
+            return None
+        first = int(first)
+        if last and int(last) < first:
+            return None
+        if first < size:
+            ranges.append((first, min(int(last), size - 1) if last else size - 1))
+    if not ranges:
+        raise ValueError("Range not satisfiable")
+    return ranges
+
+
+def if_range_matches(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Whether the Range header applies: there's no If-Range or it names the current version of the file"""
+    header = request.headers.get("if-range")
+    if header is None:
+        return True
+    header = header.strip()
+    if header.startswith('"'):
+        return header == etag
+    if last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(header) == last_modified.replace(microsecond=0)
+    except (TypeError, ValueError):
+        return False
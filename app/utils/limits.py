@@ -0,0 +1,117 @@
+import math
+import time
+from collections import OrderedDict
+from jose import jwt, JWTError
+from fastapi import Request, HTTPException, status, Depends
+
+from app.settings import auth_cred, limits_cred
+
+
+__all__ = ["RateLimiter", "ConcurrencyLimiter", "rate_limit", "concurrency_limit"]
+
+
+class RateLimiter:
+    """Per-client token buckets of one route group, refilled by `rate` tokens per second up to `burst`"""
+    instances: dict[str, "RateLimiter"] = {}
+
+    def __init__(self, name: str, rate: float, burst: int, max_clients: int = limits_cred.max_clients):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.__buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+        RateLimiter.instances[name] = self
+
+    def acquire(self, client: str) -> float:
+        """Takes a token of the client, returns 0 on success or seconds till the next token otherwise"""
+        now = time.monotonic()
+        tokens, updated = self.__buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+            self.allowed += 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+            self.rejected += 1
+        self.__buckets[client] = (tokens, now)
+        if len(self.__buckets) > self.max_clients:
+            self.__buckets.popitem(last=False)
+        return retry_after
+
+
+class ConcurrencyLimiter:
+    """Cap of requests of one route group processed at once by this worker"""
+    instances: dict[str, "ConcurrencyLimiter"] = {}
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        self.allowed = 0
+        self.rejected = 0
+        ConcurrencyLimiter.instances[name] = self
+
+    def acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        self.allowed += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+
+def _client_key(request: Request) -> str:
+    """Authorized user id when the token is valid (no database lookup), client address otherwise"""
+    token = request.cookies.get('users_access_token')
+    if token:
+        try:
+            payload = jwt.decode(token, auth_cred.secret_key, algorithms=[auth_cred.algorithm])
+            if payload.get('sub'):
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def _too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail='Too many requests',
+        headers={'Retry-After': str(max(1, math.ceil(retry_after)))}
+    )
+
+
+def rate_limit(name: str, rate: float, burst: int):
+    limiter = RateLimiter(name, rate, burst)
+
+    async def check_rate(request: Request) -> None:
+        if not limits_cred.enabled:
+            return
+        retry_after = limiter.acquire(_client_key(request))
+        if retry_after:
+            raise _too_many_requests(retry_after)
+
+    return Depends(check_rate)
+
+
+def concurrency_limit(name: str, limit: int):
+    limiter = ConcurrencyLimiter(name, limit)
+
+    async def hold_slot():
+        if not limits_cred.enabled:
+            yield
+            return
+        if not limiter.acquire():
+            raise _too_many_requests(1)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    return Depends(hold_slot)
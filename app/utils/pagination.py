@@ -0,0 +1,61 @@
+import base64
+import json
+from typing import Any, List
+from sqlalchemy import Select, ColumnElement, and_, or_, select, func
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+__all__ = ["encode_cursor", "decode_cursor", "keyset_condition", "keyset_order", "count_rows"]
+
+
+def encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Cursor is invalid")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Cursor is invalid")
+    return values
+
+
+def keyset_order(column: ColumnElement, id_column: ColumnElement, descending: bool) -> tuple:
+    """ORDER BY for keyset pages: `column` then `id_column` as a tie-breaker, NULLs as the largest values"""
+    if column is id_column:
+        return (id_column.desc() if descending else id_column.asc(),)
+    if descending:
+        return column.desc(), id_column.desc()
+    return column.asc(), id_column.asc()
+
+
+def keyset_condition(
+        column: ColumnElement, value: Any, id_column: ColumnElement, last_id: int, descending: bool
+) -> ColumnElement:
+    """Rows placed after (value, last_id) by `keyset_order`"""
+    tie = id_column < last_id if descending else id_column > last_id
+    if column is id_column:
+        return tie
+    if descending:
+        if value is None:
+            return or_(and_(column.is_(None), tie), column.is_not(None))
+        return or_(column < value, and_(column == value, tie))
+    if value is None:
+        return and_(column.is_(None), tie)
+    return or_(column > value, and_(column == value, tie), column.is_(None))
+
+
+async def count_rows(connection: AsyncConnection, query: Select, estimated: bool = False) -> int:
+    """Exact count of `query` rows or the planner's estimate, which costs no scan"""
+    if not estimated:
+        result = await connection.execute(select(func.count()).select_from(query.subquery()))
+        return result.scalar_one()
+
+    compiled = query.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])